@@ -0,0 +1,138 @@
+# Author(s): Dr. Patrick Lemoine
+# Batch question answering for the enrichment scripts. Questions are read from
+# a JSONL file (one {"id": ..., "question": ...} object or one JSON string per
+# line), sent with bounded concurrency, and each answer is appended to a JSONL
+# results file with its timing metadata as soon as it is known. Questions
+# already answered in the results file are skipped, so a crashed run resumes
+# where it stopped (failed questions are tried again).
+
+import json
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import OllamaClient
+import OllamaTranscript
+
+
+BATCH_WORKERS = 4
+PROGRESS_EVERY = 50
+STAT_FIELDS = ("total_duration", "load_duration", "prompt_eval_count", "prompt_eval_duration",
+               "eval_count", "eval_duration")
+
+
+def results_path_for(questions_path):
+    base = questions_path[:-len(".jsonl")] if questions_path.endswith(".jsonl") else questions_path
+    return base + ".results.jsonl"
+
+
+def read_questions(questions_path):
+    # [(id, question, record)]; the id defaults to the line number
+    questions = []
+    with open(questions_path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Skipping unreadable question line {number}")
+                continue
+            if isinstance(record, str):
+                record = {"question": record}
+            if not record.get("question"):
+                print(f"Skipping line {number}: no 'question' field")
+                continue
+            questions.append((record.get("id", number), record["question"], record))
+    return questions
+
+
+def completed_ids(results_path):
+    try:
+        return {entry.get("id") for entry in OllamaTranscript.read_interactions(results_path)
+                if entry.get("error") is None}
+    except FileNotFoundError:
+        return set()
+
+
+def _field(response, key):
+    if isinstance(response, dict):
+        return response.get(key)
+    return getattr(response, key, None)
+
+
+def chat_once(model_name, messages):
+    # One non-streamed chat; returns (answer, Ollama stats)
+    response = OllamaClient.get_ollama_client().chat(model=model_name, messages=messages)
+    message = _field(response, "message")
+    content = _field(message, "content") if message is not None else None
+    return content, {key: _field(response, key) for key in STAT_FIELDS}
+
+
+def ask_model(model_name):
+    # answer_fn for a plain question to one model
+    def answer_fn(question, record):
+        answer, stats = chat_once(model_name, [{"role": "user", "content": question}])
+        return answer, dict(stats, model=model_name)
+    return answer_fn
+
+
+def run_batch(questions_path, answer_fn, results_path=None, workers=BATCH_WORKERS):
+    # answer_fn(question, record) -> (answer, metadata dict). Returns a summary dict.
+    results_path = results_path or results_path_for(questions_path)
+    questions = read_questions(questions_path)
+    done = completed_ids(results_path)
+    todo = [q for q in questions if q[0] not in done]
+    print(f"Batch: {len(questions)} question(s), {len(questions) - len(todo)} already answered, "
+          f"{len(todo)} to run with {workers} worker(s) -> {results_path}")
+
+    def one(question_id, question, record):
+        started = datetime.now().isoformat()
+        start = time.perf_counter()
+        entry = {"id": question_id, "question": question, "answer": None, "error": None, "started": started}
+        try:
+            entry["answer"], metadata = answer_fn(question, record)
+            entry.update(metadata or {})
+            if entry["answer"] is None:
+                entry["error"] = "empty answer"
+        except Exception as e:
+            entry["error"] = str(e)
+        entry["elapsed"] = time.perf_counter() - start
+        return entry
+
+    start = time.perf_counter()
+    answered = failed = 0
+    pending = set()
+
+    def collect(finished):
+        nonlocal answered, failed
+        for future in finished:
+            pending.discard(future)
+            entry = future.result()
+            OllamaTranscript.append_interaction(results_path, entry)
+            if entry["error"]:
+                failed += 1
+                print(f"Question {entry['id']} failed: {entry['error']}")
+            else:
+                answered += 1
+            if (answered + failed) % PROGRESS_EVERY == 0:
+                elapsed = time.perf_counter() - start
+                print(f"Progress: {answered + failed}/{len(todo)} in {elapsed:.0f}s "
+                      f"({(answered + failed) / max(elapsed, 1e-6):.2f} questions/s)")
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for question_id, question, record in todo:
+            pending.add(executor.submit(one, question_id, question, record))
+            if len(pending) >= 2 * workers:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+        finished, _ = wait(pending)
+        collect(finished)
+
+    elapsed = time.perf_counter() - start
+    summary = {"questions": len(questions), "skipped": len(questions) - len(todo), "answered": answered,
+               "failed": failed, "seconds": elapsed, "results": results_path}
+    print(f"Batch finished: {answered} answered, {failed} failed, {summary['skipped']} skipped "
+          f"in {elapsed:.1f}s. Results: {results_path}")
+    if failed:
+        print("Run the same command again to retry the failed questions.")
+    return summary
@@ -0,0 +1,384 @@
+# Author(s): Dr. Patrick Lemoine
+# Benchmark harness that needs no GPU: a local stand-in Ollama server emulates
+# /api/generate, /api/chat, /api/tags, /api/create and /api/embed (plus
+# /api/version and /api/ps) with a configurable latency and tokens/s, and
+# scripted workloads drive the conversation, synthesis, enrichment and SQLite
+# keyword-search code paths against it. Reports p50/p95 latency, throughput
+# and peak RSS per workload, optionally saved as JSON to compare runs.
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import hashlib
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+WORDS = ("alpha beta gamma delta epsilon zeta theta lambda sigma omega paris london berlin "
+         "model token cache index kernel memory vector server client query answer").split()
+
+
+# ---- Stand-in Ollama server ---------------------------
+class MockOllamaServer:
+    def __init__(self, latency=0.05, tokens_per_sec=200.0, reply_tokens=64, embed_dim=64,
+                 models=("qwen2.5-coder:7b", "gpt-oss:20b", "deepseek-r1:8b", "nomic-embed-text")):
+        self.latency = latency
+        self.tokens_per_sec = tokens_per_sec
+        self.reply_tokens = reply_tokens
+        self.embed_dim = embed_dim
+        self.models = set(m if ":" in m else m + ":latest" for m in models)
+        self.requests = {}
+        self._lock = threading.Lock()
+        self._httpd = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._httpd.server_port}"
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, obj, code=200):
+                body = json.dumps(obj).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _body(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def do_GET(self):
+                server.count(self.path)
+                if self.path == "/api/version":
+                    self._json({"version": "0.0.0-mock"})
+                elif self.path == "/api/tags":
+                    self._json({"models": [{"name": m, "digest": hashlib.sha256(m.encode()).hexdigest()}
+                                           for m in sorted(server.models)]})
+                elif self.path == "/api/ps":
+                    self._json({"models": []})
+                else:
+                    self._json({"error": "not found"}, 404)
+
+            def do_DELETE(self):
+                server.count(self.path)
+                name = self._body().get("model", "")
+                server.models.discard(name if ":" in name else name + ":latest")
+                self._json({})
+
+            def do_POST(self):
+                server.count(self.path)
+                data = self._body()
+                if self.path in ("/api/generate", "/api/chat"):
+                    self._generate(data, chat=self.path == "/api/chat")
+                elif self.path == "/api/embed":
+                    inputs = data.get("input", "")
+                    inputs = [inputs] if isinstance(inputs, str) else inputs
+                    time.sleep(server.latency)
+                    self._json({"model": data.get("model"), "embeddings": [server.embedding(t) for t in inputs]})
+                elif self.path == "/api/create":
+                    name = data.get("model", "")
+                    server.models.add(name if ":" in name else name + ":latest")
+                    time.sleep(server.latency)
+                    self._json({"status": "success"})
+                else:
+                    self._json({"error": "not found"}, 404)
+
+            def _generate(self, data, chat):
+                prompt = json.dumps(data.get("messages") if chat else data.get("prompt", ""))
+                n = server.reply_tokens
+                eval_ns = int(1e9 * n / server.tokens_per_sec)
+                stats = {"done": True, "prompt_eval_count": len(prompt) // 4, "eval_count": n,
+                         "prompt_eval_duration": int(1e9 * server.latency), "eval_duration": eval_ns,
+                         "load_duration": 0, "total_duration": int(1e9 * server.latency) + eval_ns}
+                if "prompt" not in data and "messages" not in data:
+                    # Warm-up (empty request)
+                    self._json(dict(stats, eval_count=0, response=""))
+                    return
+                time.sleep(server.latency)
+                tokens = [random.choice(WORDS) + ("." if i % 12 == 11 else "") + " " for i in range(n)]
+                if data.get("stream", True):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/x-ndjson")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    for token in tokens:
+                        time.sleep(1.0 / server.tokens_per_sec)
+                        part = {"message": {"role": "assistant", "content": token}} if chat else {"response": token}
+                        self._chunk(dict(part, done=False))
+                    self._chunk(dict(stats, **({"message": {"role": "assistant", "content": ""}} if chat else {"response": ""})))
+                    self.wfile.write(b"0\r\n\r\n")
+                else:
+                    time.sleep(n / server.tokens_per_sec)
+                    text = "".join(tokens)
+                    self._json(dict(stats, **({"message": {"role": "assistant", "content": text}} if chat else {"response": text})))
+
+            def _chunk(self, obj):
+                line = (json.dumps(obj) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+                self.wfile.flush()
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self.base_url
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+
+    def count(self, path):
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def embedding(self, text):
+        # Deterministic pseudo-embedding from the words of the text
+        vector = [0.0] * self.embed_dim
+        for word in text.lower().split():
+            h = int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16)
+            vector[h % self.embed_dim] += 1.0
+        return vector
+
+
+# ---- Measures -----------------------------------------
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * q / 100
+    low = int(k)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (k - low)
+
+
+def peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+
+
+def run_workload(name, operation, iterations, concurrency=1):
+    # operation(i) is one unit of work; returns the stats of the workload
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def one(i):
+        start = time.perf_counter()
+        try:
+            operation(i)
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+            return
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    if concurrency > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(one, range(iterations)))
+    else:
+        for i in range(iterations):
+            one(i)
+    elapsed = time.perf_counter() - start
+    if errors:
+        print(f"[{name}] {len(errors)} error(s), first: {errors[0]}")
+    return {
+        "workload": name,
+        "ops": len(latencies),
+        "errors": len(errors),
+        "p50_ms": 1000 * percentile(latencies, 50),
+        "p95_ms": 1000 * percentile(latencies, 95),
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def make_corpus(folder, files=50, words=2000, seed=0):
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    for i in range(files):
+        with open(os.path.join(folder, f"doc_{i:04d}.txt"), "w", encoding="utf-8") as f:
+            f.write(" ".join(rng.choice(WORDS) for _ in range(words)))
+    return folder
+
+
+# ---- Workloads ----------------------------------------
+def workload_conversation(server, workdir, iterations, concurrency):
+    # OllamaConversation turns: multi-turn /api/chat with history compaction
+    # (not streamed: printing tokens would be timed with the requests)
+    import OllamaConversation
+    OllamaConversation.OLLAMA_BASE_URL = server.base_url
+
+    def operation(i):
+        messages = [{"role": "system", "content": "You are a helpful assistant."}]
+        for turn in range(5):
+            reply, messages = OllamaConversation.chat_turn(messages, f"Question {turn}: " + " ".join(WORDS),
+                                                           num_ctx=2048)
+            if reply is None:
+                raise RuntimeError("chat failed")
+
+    return run_workload("conversation", operation, iterations, concurrency)
+
+
+def workload_synthesis(server, workdir, iterations, concurrency):
+    # OllamaSynthesis: the models queried in parallel, then one synthesis request
+    import OllamaSynthesis
+    OllamaSynthesis.OLLAMA_BASE_URL = server.base_url
+
+    def operation(i):
+        answers = OllamaSynthesis.ask_models_parallel(OllamaSynthesis.MODEL_NAMES, f"Question {i}")
+        if not answers or OllamaSynthesis.synthesize_responses([a for _, a in answers]) is None:
+            raise RuntimeError("synthesis failed")
+
+    return run_workload("synthesis", operation, iterations, concurrency)
+
+
+def workload_enrichment(server, workdir, iterations, concurrency):
+    # Enrichment pipeline: ingestion, token count, model create (or reuse), first question
+    import OllamaDocuments
+    import OllamaTokens
+    import OllamaModelRegistry
+    import OllamaChat
+    corpus = make_corpus(os.path.join(workdir, "enrichment"), files=20, words=1500)
+    paths = sorted(os.path.join(corpus, f) for f in os.listdir(corpus) if f.endswith(".txt"))
+    registry = os.path.join(workdir, "model_registry.db")
+
+    def operation(i):
+        docs = OllamaDocuments.load_documents(paths, 1, os.path.join(corpus, OllamaDocuments.DOCUMENT_CACHE_DB))
+        text = "\n".join(d["data"] for d in docs)
+        num_ctx = OllamaTokens.num_ctx_for(OllamaTokens.count_tokens(text))
+        name = OllamaModelRegistry.create_or_reuse("bench-expert", "qwen2.5-coder:7b",
+                                                   f"Use this text:\n{text}",
+                                                   {"temperature": 0.7, "num_ctx": num_ctx}, registry)
+        OllamaChat.chat([{"role": "user", "content": "Hello."}], name)
+
+    return run_workload("enrichment", operation, iterations, 1)
+
+
+def workload_retrieval(server, workdir, iterations, concurrency):
+    # RAG mode of the enrichment scripts: index once, then embed + top-k per question
+    import OllamaRetrieval
+    import OllamaChat
+    corpus = make_corpus(os.path.join(workdir, "retrieval"), files=20, words=1500, seed=1)
+    documents = []
+    for file in sorted(os.listdir(corpus)):
+        with open(os.path.join(corpus, file), encoding="utf-8") as f:
+            documents.append((file, f.read()))
+    db_path = os.path.join(workdir, "retrieval.db")
+    OllamaRetrieval.build_index(db_path, documents)
+    index = OllamaRetrieval.load_index(db_path)
+
+    def operation(i):
+        messages = OllamaRetrieval.retrieval_messages(index, f"{random.choice(WORDS)} {random.choice(WORDS)}")
+        if OllamaChat.chat(messages, "qwen2.5-coder:7b")[0] is None:
+            raise RuntimeError("chat failed")
+
+    return run_workload("retrieval", operation, iterations, concurrency)
+
+
+def workload_keyword_search(server, workdir, iterations, concurrency):
+    # SQLite keyword search: FTS5 index build, then cached/uncached lookups
+    import OllamaKeywordSearch
+    corpus = make_corpus(os.path.join(workdir, "keywords"), files=200, words=500, seed=2)
+    start = time.perf_counter()
+    OllamaKeywordSearch.recherche_fichiers_keywords_sqlite(corpus, ["alpha"])
+    print(f"[keyword_search] index built in {time.perf_counter() - start:.2f}s")
+    rng = random.Random(3)
+    queries = [rng.sample(WORDS, 2) for _ in range(max(1, iterations // 2))]
+
+    def operation(i):
+        OllamaKeywordSearch.recherche_fichiers_keywords_sqlite(corpus, queries[i % len(queries)])
+
+    return run_workload("keyword_search", operation, iterations, 1)
+
+
+WORKLOADS = {
+    "conversation": workload_conversation,
+    "synthesis": workload_synthesis,
+    "enrichment": workload_enrichment,
+    "retrieval": workload_retrieval,
+    "keyword_search": workload_keyword_search,
+}
+
+
+def print_report(results, server):
+    print("\n--- Benchmark report ---")
+    print(f"{'workload':16s} {'ops':>5s} {'err':>4s} {'p50 ms':>9s} {'p95 ms':>9s} {'ops/s':>8s} {'peak RSS MB':>12s}")
+    for r in results:
+        print(f"{r['workload']:16s} {r['ops']:5d} {r['errors']:4d} {r['p50_ms']:9.1f} {r['p95_ms']:9.1f} "
+              f"{r['throughput']:8.2f} {r['peak_rss_mb']:12.1f}")
+    print("Mock requests:", dict(sorted(server.requests.items())))
+
+
+def main(workloads, iterations=10, concurrency=1, latency=0.05, tokens_per_sec=200.0, reply_tokens=64,
+         output=None):
+    import OllamaClient
+    server = MockOllamaServer(latency, tokens_per_sec, reply_tokens)
+    base_url = server.start()
+    OllamaClient.configure(base_url=base_url, retries=0)
+    workdir = tempfile.mkdtemp(prefix="ollama_bench_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    results = []
+    try:
+        for name in workloads:
+            print(f"Running {name} ({iterations} iterations)...")
+            try:
+                results.append(WORKLOADS[name](server, workdir, iterations, concurrency))
+            except ImportError as e:
+                print(f"[{name}] skipped: {e}")
+    finally:
+        os.chdir(cwd)
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+    print_report(results, server)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({"settings": {"iterations": iterations, "concurrency": concurrency, "latency": latency,
+                                    "tokens_per_sec": tokens_per_sec, "reply_tokens": reply_tokens},
+                       "results": results}, f, indent=2)
+        print("Results saved to:", output)
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark the scripts against a stand-in Ollama server.")
+    parser.add_argument('--Workloads', type=str, default=",".join(WORKLOADS),
+                        help='Workloads to run, separated by commas')
+    parser.add_argument('--Iterations', type=int, default=10, help='Operations per workload')
+    parser.add_argument('--Concurrency', type=int, default=1, help='Concurrent operations (conversation, synthesis, retrieval)')
+    parser.add_argument('--Latency', type=float, default=0.05, help='Mock server latency before the first token (s)')
+    parser.add_argument('--TokensPerSec', type=float, default=200.0, help='Mock generation speed')
+    parser.add_argument('--ReplyTokens', type=int, default=64, help='Tokens per mock reply')
+    parser.add_argument('--Output', type=str, default=None, help='Save the results as JSON')
+    args = parser.parse_args()
+
+    selected = [w.strip() for w in args.Workloads.split(",") if w.strip()]
+    unknown = [w for w in selected if w not in WORKLOADS]
+    if unknown:
+        parser.error(f"unknown workload(s): {unknown}")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    main(selected, args.Iterations, args.Concurrency, args.Latency, args.TokensPerSec, args.ReplyTokens,
+         args.Output)
@@ -0,0 +1,86 @@
+# Author(s): Dr. Patrick Lemoine
+# Multi-turn conversation engine on /api/chat. The message list is sent as is
+# every turn, so the server sees the same prefix and reuses its KV cache instead
+# of re-evaluating a freshly flattened prompt. When the history gets close to
+# num_ctx, the oldest turns are folded into a rolling summary.
+
+import OllamaClient
+import OllamaStream
+import OllamaWarmup
+
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+SUMMARY_PROMPT = (
+    "Summarize the following conversation in a few sentences. Keep names, facts, "
+    "decisions and open questions that may be needed later.\n\n"
+)
+
+
+def estimate_tokens(messages):
+    # Rough count (about 4 characters per token plus per-message overhead)
+    return sum(len(m.get("content") or "") for m in messages) // 4 + 4 * len(messages)
+
+
+def chat(messages, model, temperature=0.5, num_ctx=None, stream=False, on_sentence=None,
+         base_url=None, keep_alive=None):
+    # Returns (reply, final stats) or (None, {}) on error
+    url = OllamaClient.api_url("/api/chat", base_url)
+    options = {"temperature": temperature}
+    if num_ctx:
+        options["num_ctx"] = num_ctx
+    data = {
+        "model": model,
+        "messages": messages,
+        "options": options
+    }
+    data["keep_alive"] = OllamaWarmup.keep_alive_value(keep_alive) if keep_alive is not None else OllamaWarmup.keep_alive_for(model)
+    try:
+        if stream:
+            reply, final = OllamaStream.stream_reply(url, data, on_sentence=on_sentence)
+            OllamaWarmup.report_load(model, final)
+            return reply, final
+        data["stream"] = False
+        response = OllamaClient.post(url, json=data)
+        if response.status_code == 200:
+            content = response.json()
+            OllamaWarmup.report_load(model, content)
+            return content.get("message", {}).get("content", ""), content
+        print(f"Generation error: {response.status_code} {response.text}")
+    except Exception as e:
+        print(f"Ollama request error: {e}")
+    return None, {}
+
+
+def history_tokens(messages, last_stats=None):
+    estimate = estimate_tokens(messages)
+    if last_stats:
+        # Stats of the previous turn cover the whole prompt plus the reply
+        counted = last_stats.get("prompt_eval_count", 0) + last_stats.get("eval_count", 0)
+        estimate = max(estimate, counted)
+    return estimate
+
+
+def compact_history(messages, model, num_ctx, last_stats=None, keep_last=4, threshold=0.75,
+                    base_url=None):
+    # Fold everything between the system prompt and the last `keep_last`
+    # messages into one summary message once the history uses more than
+    # `threshold` of the context window. Returns the (possibly new) list.
+    if history_tokens(messages, last_stats) < threshold * num_ctx:
+        return messages
+    head = [m for m in messages[:1] if m["role"] == "system"]
+    body = messages[len(head):]
+    if len(body) <= keep_last:
+        return messages
+    old, recent = body[:-keep_last], body[-keep_last:]
+
+    transcript = "\n".join(f"{m['role'].upper()}: {m['content']}" for m in old)
+    summary, _ = chat(
+        [{"role": "user", "content": SUMMARY_PROMPT + transcript}],
+        model, temperature=0.0, num_ctx=num_ctx, base_url=base_url
+    )
+    if not summary:
+        # Summarization failed: drop the oldest turns rather than overflow
+        print("History summary failed, dropping the oldest turns.")
+        return head + recent
+    print(f"History compacted: {len(old)} messages folded into a summary.")
+    return head + [{"role": "system", "content": SUMMARY_PREFIX + summary}] + recent
@@ -0,0 +1,169 @@
+# Author(s): Dr. Patrick Lemoine
+# Shared HTTP client for the Ollama scripts: one pooled keep-alive session,
+# default timeouts on every call and retry/backoff on connection errors.
+# is_server_ready()/wait_until_ready() probe /api/version to detect the server.
+# Generation/embedding calls are recorded by OllamaMetrics.
+
+import os
+import time
+import threading
+import json
+import requests
+import OllamaMetrics
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+
+POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", "10"))
+CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "600"))
+RETRIES = int(os.getenv("OLLAMA_RETRIES", "3"))
+BACKOFF_FACTOR = float(os.getenv("OLLAMA_BACKOFF_FACTOR", "0.5"))
+PROBE_TIMEOUT = float(os.getenv("OLLAMA_PROBE_TIMEOUT", "0.5"))
+READY_TIMEOUT = float(os.getenv("OLLAMA_READY_TIMEOUT", "30"))
+
+_session = None
+_ollama_client = None
+_lock = threading.Lock()
+
+
+def configure(base_url=None, pool_size=None, connect_timeout=None, read_timeout=None,
+              retries=None, backoff_factor=None):
+    global OLLAMA_BASE_URL, POOL_SIZE, CONNECT_TIMEOUT, READ_TIMEOUT, RETRIES, BACKOFF_FACTOR
+    global _session, _ollama_client
+    with _lock:
+        if base_url is not None:
+            OLLAMA_BASE_URL = base_url.rstrip("/")
+        if pool_size is not None:
+            POOL_SIZE = pool_size
+        if connect_timeout is not None:
+            CONNECT_TIMEOUT = connect_timeout
+        if read_timeout is not None:
+            READ_TIMEOUT = read_timeout
+        if retries is not None:
+            RETRIES = retries
+        if backoff_factor is not None:
+            BACKOFF_FACTOR = backoff_factor
+        # Rebuild lazily with the new settings
+        if _session is not None:
+            _session.close()
+        _session = None
+        _ollama_client = None
+
+
+def _build_session():
+    retry = Retry(
+        total=RETRIES,
+        connect=RETRIES,
+        read=0,
+        status=RETRIES,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(["GET", "POST", "DELETE"]),
+        backoff_factor=BACKOFF_FACTOR,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def default_timeout():
+    return (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+
+def api_url(path, base_url=None):
+    if path.startswith("http://") or path.startswith("https://"):
+        return path
+    return f"{(base_url or OLLAMA_BASE_URL).rstrip('/')}/{path.lstrip('/')}"
+
+
+def get(url, timeout=None, **kwargs):
+    return get_session().get(api_url(url), timeout=timeout or default_timeout(), **kwargs)
+
+
+def post(url, timeout=None, **kwargs):
+    start = time.perf_counter()
+    response = get_session().post(api_url(url), timeout=timeout or default_timeout(), **kwargs)
+    if not kwargs.get("stream"):
+        # Streamed replies are recorded by OllamaStream.iter_ndjson on their last chunk
+        OllamaMetrics.record_json(url, kwargs.get("json"), response, time.perf_counter() - start)
+    return response
+
+
+def delete(url, timeout=None, **kwargs):
+    return get_session().delete(api_url(url), timeout=timeout or default_timeout(), **kwargs)
+
+
+def is_server_ready(base_url=None, timeout=None):
+    # Single short request, outside the retrying session
+    try:
+        response = requests.get(api_url("/api/version", base_url), timeout=timeout or PROBE_TIMEOUT)
+        return response.status_code == 200
+    except requests.RequestException:
+        return False
+
+
+def wait_until_ready(base_url=None, timeout=None, delay=0.1, max_delay=2.0):
+    # Poll /api/version with exponential backoff until the server answers
+    deadline = time.monotonic() + (timeout or READY_TIMEOUT)
+    while True:
+        if is_server_ready(base_url):
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
+
+
+def get_ollama_client():
+    # Same pool/timeout policy for the scripts that go through the ollama package
+    global _ollama_client
+    if _ollama_client is None:
+        import httpx
+        import ollama
+        with _lock:
+            if _ollama_client is None:
+                _ollama_client = ollama.Client(
+                    host=OLLAMA_BASE_URL,
+                    timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+                    # httpx ignores `limits` when a transport is given: the pool size goes to the transport
+                    transport=httpx.HTTPTransport(retries=RETRIES, limits=httpx.Limits(
+                        max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE)),
+                    event_hooks={"request": [_hook_request], "response": [_hook_response]},
+                )
+    return _ollama_client
+
+
+def _hook_request(request):
+    request.extensions["metrics_start"] = time.perf_counter()
+
+
+def _hook_response(response):
+    # Non-streamed ollama.Client calls only (reading a stream here would buffer it)
+    request = response.request
+    endpoint = OllamaMetrics.endpoint_of(request.url.path)
+    if endpoint is None:
+        return
+    try:
+        body = json.loads(request.content or b"{}")
+    except ValueError:
+        return
+    if body.get("stream", endpoint != "/api/embed"):
+        return
+    response.read()
+    OllamaMetrics.record_json(request.url.path, body, response,
+                              time.perf_counter() - request.extensions.get("metrics_start", time.perf_counter()))
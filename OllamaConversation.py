@@ -5,7 +5,9 @@ import sys
 import json
 import subprocess
 import psutil
-import requests
+import OllamaClient
+import OllamaStream
+import OllamaChat
 from datetime import datetime
 import pyttsx3
 
@@ -43,6 +45,7 @@ def launch_speech_if_needed():
     engine.setProperty('volume', int(volume))
     voices = engine.getProperty('voices')
     engine.setProperty('voice', voices[num_voice].id)
+    return engine
    
 def play_speech(text):
     engine.say(text)
@@ -76,6 +79,9 @@ def is_ollama_running():
     return False
 
 def launch_ollama_if_needed():
+    if OllamaClient.is_server_ready():
+        print("Ollama is already running.")
+        return
     path = load_path_from_json()
     if path is None or not os.path.isfile(path):
         path = find_ollama_executable()
@@ -84,17 +90,18 @@ def launch_ollama_if_needed():
         else:
             print("Ollama.exe not found on the system.")
             return
+    # Not answering yet: the process scan tells a booting server from a stopped one
     if not is_ollama_running():
         # Start Ollama server (add 'serve' argument if necessary)
         subprocess.Popen([path, "serve"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         print(f"Launching Ollama from: {path}")
-    else:
-        print("Ollama is already running.")
+    if not OllamaClient.wait_until_ready():
+        print(f"Ollama server not answering at {OllamaClient.OLLAMA_BASE_URL}.")
 
 def list_models():
     try:
         url = f"{OLLAMA_BASE_URL}/api/tags"  # Endpoint for listing models
-        response = requests.get(url)
+        response = OllamaClient.get(url)
         if response.status_code == 200:
             models = response.json().get("models", [])
             return [m["name"] for m in models]
@@ -119,7 +126,7 @@ def ask_ollama(messages):
         "stream": False
     }
     try:
-        response = requests.post(url, json=data)
+        response = OllamaClient.post(url, json=data)
         if response.status_code == 200:
             content = response.json()
             return content.get("response", "No response field in reply.")
@@ -131,99 +138,101 @@ def ask_ollama(messages):
         return None
 
 
-def ask_ollama_temperature(messages, temperature=0.5):
-    url = f"{OLLAMA_BASE_URL}/api/generate"
+def ask_ollama_chat(messages, temperature=0.5, num_ctx=None, stream=False, on_sentence=None):
+    # /api/chat keeps the message list as a stable prefix so the server reuses its cache
+    reply, stats = OllamaChat.chat(messages, MODEL_NAME, temperature=temperature, num_ctx=num_ctx,
+                                   stream=stream, on_sentence=on_sentence, base_url=OLLAMA_BASE_URL)
+    return reply, stats
 
-    prompt = ""
-    for msg in messages:
-        role = msg['role']
-        content = msg['content']
-        prompt += f"{role.upper()}: {content}\n"
-    data = {
-        "model": MODEL_NAME,
-        "prompt": prompt,
-        "stream": False,
-        "options": {
-            "temperature": temperature
-        }
-    }
-    try:
-        response = requests.post(url, json=data)
-        if response.status_code == 200:
-            content = response.json()
-            return content.get("response", "No response field in reply.")
-        else:
-            print(f"Generation error: {response.status_code} {response.text}")
-            return None
-    except Exception as e:
-        print(f"Ollama request error: {e}")
-        return None
+
+def chat_turn(messages, user_input, temperature=0.5, num_ctx=4096, stream=False, on_sentence=None):
+    # One turn: question, reply, then history compaction. Returns (reply, messages);
+    # reply is None when the request failed.
+    messages.append({"role": "user", "content": user_input})
+    reply, stats = ask_ollama_chat(messages, temperature, num_ctx, stream, on_sentence)
+    if reply is None:
+        return None, messages
+    messages.append({"role": "assistant", "content": reply})
+    # Fold the oldest turns into a summary before the history overflows num_ctx
+    messages = OllamaChat.compact_history(messages, MODEL_NAME, num_ctx, stats, base_url=OLLAMA_BASE_URL)
+    return reply, messages
 
 
 
-def main(path,qSpeech,temperature): 
+def main(path,qSpeech,temperature,qStream=False,num_ctx=4096): 
     
     # Launch Text to Speech
-    if qSpeech:
+    speech_queue = None
+    if qSpeech and qStream:
+        # Sentences are spoken by a worker thread while the answer is still generating
+        speech_queue = OllamaStream.start_speech_worker(launch_speech_if_needed)
+    elif qSpeech:
         launch_speech_if_needed()
         
-    # Launch Ollama if it's not already running
-    launch_ollama_if_needed()
+    try:
+        # Launch Ollama if it's not already running
+        launch_ollama_if_needed()
 
-    # Check if the model exists locally
-    models = list_models()
-    if MODEL_NAME not in models:
-        print(f"Model {MODEL_NAME} not found locally. Available models: {models}")
-        return
+        # Check if the model exists locally
+        models = list_models()
+        if MODEL_NAME not in models:
+            print(f"Model {MODEL_NAME} not found locally. Available models: {models}")
+            return
 
-    # Initialize conversation with a system message
-    messages = [
-        {"role": "system", "content": "You are a helpful assistant."}
-    ]
-    # Create a file to save the conversation, using datetime in the filename
-    now_str = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"ollama_conversation_{now_str}.txt"
-    filename = path+"/"+filename
+        # Initialize conversation with a system message
+        messages = [
+            {"role": "system", "content": "You are a helpful assistant."}
+        ]
+        # Create a file to save the conversation, using datetime in the filename
+        now_str = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"ollama_conversation_{now_str}.txt"
+        filename = path+"/"+filename
     
-    with open(filename, "w", encoding="utf-8") as file:
-        print("")
-        print(f"Start chatting with {MODEL_NAME}. Type 'exit' to quit.")
-        print("")
-        while True:
-            #user_input = input("You: ")
-            user_input = input("👦: ")
-            if user_input.lower() in ["exit", "quit", ""]:
-                print("Ending conversation.")
-                sys.exit()
-                break
+        with open(filename, "w", encoding="utf-8") as file:
+            print("")
+            print(f"Start chatting with {MODEL_NAME}. Type 'exit' to quit.")
+            print("")
+            while True:
+                #user_input = input("You: ")
+                user_input = input("👦: ")
+                if user_input.lower() in ["exit", "quit", ""]:
+                    print("Ending conversation.")
+                    sys.exit()
+                    break
             
-            if user_input.startswith("/temp "):
-               try:
-                   new_temp = float(user_input.split()[1])
-                   if 0.0 <= new_temp <= 1.0:
-                       temperature = new_temp
-                       print(f"Update Temperature  {temperature}")
-                   else:
-                       print("Temperature must between 0 et 1.")
-               except ValueError:
-                   print("Temperature Format Unvalide")
-               continue 
+                if user_input.startswith("/temp "):
+                   try:
+                       new_temp = float(user_input.split()[1])
+                       if 0.0 <= new_temp <= 1.0:
+                           temperature = new_temp
+                           print(f"Update Temperature  {temperature}")
+                       else:
+                           print("Temperature must between 0 et 1.")
+                   except ValueError:
+                       print("Temperature Format Unvalide")
+                   continue 
                  
-            messages.append({"role": "user", "content": user_input})
-            assistant_reply = ask_ollama_temperature(messages,temperature)
-            if assistant_reply is None:
-                print("No response received.")
-                break
-            messages.append({"role": "assistant", "content": assistant_reply})
-            #print(f"Assistant: {assistant_reply}")
+                on_sentence = speech_queue.put if speech_queue is not None else None
+                assistant_reply, messages = chat_turn(messages,user_input,temperature,num_ctx,qStream,on_sentence)
+                if assistant_reply is None:
+                    print("No response received.")
+                    break
+                #print(f"Assistant: {assistant_reply}")
             
-            print(f"🤖: {assistant_reply}")
+                if not qStream:
+                    print(f"🤖: {assistant_reply}")
             
-            if qSpeech:
-                play_speech(assistant_reply)
+                if qSpeech and not qStream:
+                    play_speech(assistant_reply)
+
+                file.write(f"You: {user_input}\n")
+                file.write(f"Assistant: {assistant_reply}\n\n")
+                file.flush()
+    finally:
+        # Also on errors and Ctrl+C: the speech thread is not left running
+        if speech_queue is not None:
+            OllamaStream.stop_speech_worker(speech_queue)
 
-            file.write(f"You: {user_input}\n")
-            file.write(f"Assistant: {assistant_reply}\n\n")
 
 if __name__ == "__main__":
     import argparse
@@ -233,14 +242,17 @@ if __name__ == "__main__":
     parser.add_argument('--URL', type=str, default="http://localhost:11434", help='URL')
     parser.add_argument('--Speech', type=int, default=0, help='Speech on or off ')
     parser.add_argument('--Temperature', type=float, default=0.0, help='Temperature between 0.0 and 1.0 ')
+    parser.add_argument('--Stream', type=int, default=0, help='Print (and speak) the answer while it is generated (1=yes, 0=no)')
+    parser.add_argument('--NumCtx', type=int, default=4096, help='Context window; older turns are summarized when the history gets close to it')
     
     
     args = parser.parse_args()    
     MODEL_NAME =  args.Model
     OLLAMA_BASE_URL = args.URL
+    OllamaClient.configure(base_url=OLLAMA_BASE_URL)
     
     if not os.path.exists(args.Path):
         os.makedirs(args.Path)
         
-    main(args.Path,args.Speech,args.Temperature)
+    main(args.Path,args.Speech,args.Temperature,args.Stream == 1,args.NumCtx)
 
@@ -4,7 +4,10 @@ import os
 import json
 import cv2
 import base64
-import requests
+import OllamaClient
+import OllamaStream
+import OllamaChat
+import OllamaImages
 from datetime import datetime
 import pyttsx3
 import psutil
@@ -52,6 +55,9 @@ def is_ollama_running():
     return False
 
 def launch_ollama_if_needed():
+    if OllamaClient.is_server_ready():
+        print("Ollama is already running.")
+        return
     path = load_path_from_json()
     if path is None or not os.path.isfile(path):
         path = find_ollama_executable()
@@ -60,18 +66,19 @@ def launch_ollama_if_needed():
         else:
             print("Ollama.exe not found on the system.")
             return
+    # Not answering yet: the process scan tells a booting server from a stopped one
     if not is_ollama_running():
         # Start Ollama server (add 'serve' argument if necessary)
         subprocess.Popen([path, "serve"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         print(f"Launching Ollama from: {path}")
-    else:
-        print("Ollama is already running.")
+    if not OllamaClient.wait_until_ready():
+        print(f"Ollama server not answering at {OllamaClient.OLLAMA_BASE_URL}.")
 
 
 def list_models():
     try:
         url = f"{OLLAMA_BASE_URL}/api/tags"  # Endpoint for listing models
-        response = requests.get(url)
+        response = OllamaClient.get(url)
         if response.status_code == 200:
             models = response.json().get("models", [])
             return [m["name"] for m in models]
@@ -125,7 +132,7 @@ def ask_ollama_with_image(messages, base64_image, base_url, model_name):
         "stream": False
     }
     
-    response = requests.post(url, json=data)
+    response = OllamaClient.post(url, json=data)
     #if response.status_code == 500:
     if response.status_code == 500:
           content = response.json()
@@ -163,7 +170,7 @@ def ask_ollama_with_image_temperature(messages, base64_image, base_url, model_na
         }
     }
     
-    response = requests.post(url, json=data)
+    response = OllamaClient.post(url, json=data)
     #if response.status_code == 500:
     if response.status_code == 500:
           content = response.json()
@@ -191,7 +198,7 @@ def ask_ollama_with_image_optimized_New(messages, base64_image, model_name):
         "stream": False
     }
 
-    response = ollama.chat(
+    response = OllamaClient.get_ollama_client().chat(
         model=model_name,
         messages=prompt,
         options=options
@@ -226,7 +233,7 @@ def ask_ollama_with_image2(messages, image_path, base_url, model_name):
     }
     
     try:
-        response = requests.post(url, json=data, timeout=120)
+        response = OllamaClient.post(url, json=data, timeout=120)
         if response.status_code == 200:
             content = response.json()
             print("Full API response:", content)
@@ -249,7 +256,7 @@ def ask_ollama_with_text(messages, base_url, model_name):
     url = f"{base_url}/api/chat"
     data = {"model": model_name, "messages": messages}
     try:
-        r = requests.post(url, json=data, timeout=120)
+        r = OllamaClient.post(url, json=data, timeout=120)
         if r.status_code == 200:
             return r.json()
         else:
@@ -273,7 +280,7 @@ def ask_ollama(messages):
         "stream": False
     }
     try:
-        response = requests.post(url, json=data)
+        response = OllamaClient.post(url, json=data)
         if response.status_code == 200:
             content = response.json()
             return content.get("response", "No response field in reply.")
@@ -314,6 +321,14 @@ def show_and_save_image(image_path):
 
 
 
+def ask_image_session(messages, temperature=0.5, qStream=False, on_sentence=None):
+    # Multi-turn chat: the image is attached once to a user message of the history,
+    # so the server keeps the same prefix (image included) from turn to turn
+    reply, _ = OllamaChat.chat(messages, MODEL_NAME, temperature=temperature, stream=qStream,
+                               on_sentence=on_sentence, base_url=OLLAMA_BASE_URL)
+    return reply
+
+
 def extraire_contenu(json_string):
     json_string = json_string.split(": {")[1].rstrip()
     json_string = "{" + json_string
@@ -322,11 +337,17 @@ def extraire_contenu(json_string):
     
     return contenu
 
-def main(path,qSpeech,img_path,temperature): 
+def main(path,qSpeech,img_path,temperature,qStream=False): 
     
     # Launch Text to Speech
-    if qSpeech:
-        launch_speech_if_needed()
+    engine = None
+    speech_queue = None
+    if qSpeech and qStream:
+        # Sentences are spoken by a worker thread while the answer is still generating
+        speech_queue = OllamaStream.start_speech_worker(launch_speech_if_needed)
+    elif qSpeech:
+        engine = launch_speech_if_needed()
+    on_sentence = speech_queue.put if speech_queue is not None else None
         
     # Launch Ollama if it's not already running
     launch_ollama_if_needed()
@@ -339,7 +360,9 @@ def main(path,qSpeech,img_path,temperature):
     
     
     #○print("Path Image: "+img_path)
-    base64image = encode_image_to_base64(img_path)
+    cache_db = os.path.join(path, OllamaImages.IMAGE_CACHE_DB)
+    # Downscaled to the model's native resolution and re-encoded before base64
+    image_hash, base64image = OllamaImages.encode_image_cached(img_path, cache_db, OllamaImages.max_side_for_model(MODEL_NAME))
     if base64image is None:
         return
     #show_and_save_image(img_path)
@@ -360,7 +383,9 @@ def main(path,qSpeech,img_path,temperature):
     assistant_reply = ask_ollama(messages)
     if assistant_reply is None:
         print("No response received.")
-    messages.append({"role": "assistant", "content": assistant_reply})
+        messages.pop()
+    else:
+        messages.append({"role": "assistant", "content": assistant_reply})
     #print(f"Assistant: {assistant_reply}")
     
     print("")
@@ -372,17 +397,34 @@ def main(path,qSpeech,img_path,temperature):
  
     print(f"👦:  {user_input}\n")
     
+    # The image is sent once, with the first question about it
+    messages.append({"role": "user", "content": user_input, "images": [base64image]})
     
-    result = ask_ollama_with_image_temperature(user_input, base64image, OLLAMA_BASE_URL,MODEL_NAME,temperature)
-    
-    result = extraire_contenu(result)
+    # Same picture, model and question at temperature 0: reuse the stored answer
+    result = None
+    if temperature == 0.0:
+        result = OllamaImages.get_cached_answer(cache_db, image_hash, MODEL_NAME, user_input, temperature)
+    if result is not None:
+        print(f"🤖: {result}\n\n")
+        # Cached answers go through the same speech path as generated ones
+        if speech_queue is not None:
+            speech_queue.put(result)
+        elif engine is not None:
+            play_speech(engine, result)
+    else:
+        result = ask_image_session(messages, temperature, qStream, on_sentence)
+        if result is not None and temperature == 0.0:
+            OllamaImages.save_cached_answer(cache_db, image_hash, MODEL_NAME, user_input, temperature, result)
+        if result is not None and not qStream:
+            print(f"🤖: {result}\n\n")
+            if engine is not None:
+                play_speech(engine, result)
 
 
     if result is None:
         print("Initial error during image request.")
         return
     messages.append({"role": "assistant", "content": result})
-    print(f"🤖: {result}\n\n")
     
     with open(filename, "w", encoding="utf-8") as file:        
         file.write(f"You: {user_input}\n")
@@ -393,6 +435,8 @@ def main(path,qSpeech,img_path,temperature):
             user_input = input("👦: ")
             if user_input.lower() in ["exit", "quit", ""]:
                 print("Ending conversation.")
+                if speech_queue is not None:
+                    OllamaStream.stop_speech_worker(speech_queue)
                 break
             
             if user_input.startswith("/temp "):
@@ -409,8 +453,7 @@ def main(path,qSpeech,img_path,temperature):
            
             
             messages.append({"role": "user", "content": user_input})
-            assistant_reply = ask_ollama_with_image_temperature(user_input, base64image, OLLAMA_BASE_URL,MODEL_NAME,temperature)
-            assistant_reply = extraire_contenu(assistant_reply)
+            assistant_reply = ask_image_session(messages, temperature, qStream, on_sentence)
             
             
             if assistant_reply is None:
@@ -418,13 +461,15 @@ def main(path,qSpeech,img_path,temperature):
                 break
             messages.append({"role": "assistant", "content": assistant_reply})
 
-            print(f"🤖: {assistant_reply}")
+            if not qStream:
+                print(f"🤖: {assistant_reply}")
             
-            if qSpeech:
-                play_speech(assistant_reply)
+            if engine is not None:
+                play_speech(engine, assistant_reply)
 
             file.write(f"You: {user_input}\n")
             file.write(f"Assistant: {assistant_reply}\n\n")
+            file.flush()
 
 
 
@@ -437,6 +482,7 @@ if __name__ == "__main__":
     parser.add_argument('--Image', type=str, required=True, help='Path to the .JPG image file')
     parser.add_argument('--Speech', type=int, default=0, help='Text-to-speech (1=yes, 0=no)')
     parser.add_argument('--Temperature', type=float, default=0.0, help='Temperature between 0.0 and 1.0')
+    parser.add_argument('--Stream', type=int, default=0, help='Print (and speak) the answer while it is generated (1=yes, 0=no)')
 
 
     args = parser.parse_args()
@@ -449,7 +495,8 @@ if __name__ == "__main__":
         
     MODEL_NAME =  args.Model
     OLLAMA_BASE_URL = args.URL
+    OllamaClient.configure(base_url=OLLAMA_BASE_URL)
     
     image_path = args.Path+"/"+args.Image
     
-    main(args.Path,args.Speech,image_path,args.Temperature)
+    main(args.Path,args.Speech,image_path,args.Temperature,args.Stream == 1)
@@ -0,0 +1,291 @@
+# Author(s): Dr. Patrick Lemoine
+# Document ingestion for the enrichment scripts. Files (.txt, .pdf, images)
+# are parsed in a pool of worker processes, results are put back in the
+# original file order, and a progress/throughput report is printed.
+# Extracted text is kept in a content-addressed SQLite cache (file SHA-256 +
+# extractor and token counter -> text, per-page offsets, token count), so
+# unchanged documents are not parsed again; the cache is bounded in size
+# (LRU eviction).
+
+import io
+import os
+import time
+import json
+import sqlite3
+import base64
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import PyPDF2
+import OllamaImages
+import OllamaTokens
+
+
+TEXT_EXTENSIONS = ['txt', 'pdf']
+EXTRACTORS = {'txt': 'txt', 'pdf': 'pypdf2'}     # cache key of each text extractor
+IMAGE_EXTENSIONS = ['jpg', 'jpeg', 'png', 'bmp']
+PROGRESS_EVERY = 10
+
+DOCUMENT_CACHE_DB = "document_cache.db"
+CACHE_MAX_BYTES = 256 * 1024 * 1024     # extracted text kept in the cache (least recently used evicted)
+
+
+def count_tokens(text, model=None, mode=None):
+    # OllamaTokens counter; `mode` is passed explicitly to the worker processes,
+    # which do not see OllamaTokens.configure() of the parent
+    return OllamaTokens.count_tokens(text, model, mode)
+
+
+def cache_key(extractor, model=None, mode=None):
+    # Extractor + token counter: a count made with another counter is not reused
+    mode = mode or OllamaTokens.MODE
+    if mode == "exact":
+        mode = f"exact:{OllamaTokens.model_family(model)}"
+    return f"{extractor}/{mode}"
+
+
+def read_txt(full_path):
+    with open(full_path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def read_txt_pages(full_path):
+    return [read_txt(full_path)]
+
+
+def read_pdf_pages(full_path):
+    with open(full_path, 'rb') as pdf_file:
+        return pdf_pages(pdf_file)
+
+
+def pdf_pages(pdf_file):
+    pdf_reader = PyPDF2.PdfReader(pdf_file)
+    content = []
+    for page in pdf_reader.pages:
+        content.append(page.extract_text() or "")
+    return content
+
+
+def read_pdf(full_path):
+    return "\n".join(read_pdf_pages(full_path))
+
+
+def join_pages(pages):
+    # Returns (text, [start offset of each page in text])
+    offsets = []
+    position = 0
+    for page in pages:
+        offsets.append(position)
+        position += len(page) + 1
+    return "\n".join(pages), offsets
+
+
+def split_pages(text, offsets):
+    bounds = list(offsets) + [len(text) + 1]
+    return [text[bounds[i]:bounds[i + 1] - 1] for i in range(len(offsets))]
+
+
+def encode_image(full_path):
+    # Returns (sha256 of the file, base64 of the downscaled/re-encoded image)
+    with open(full_path, 'rb') as img_file:
+        raw = img_file.read()
+    image_bytes = OllamaImages.prepare_image_bytes(raw)
+    return hashlib.sha256(raw).hexdigest(), base64.b64encode(image_bytes).decode('utf-8')
+
+
+def load_document(full_path, model=None, mode=None):
+    # Worker: returns a dict with kind ('txt', 'pdf', 'image'), data, tokens,
+    # pages (start offsets in data), bytes, sha256 (of the bytes parsed) and error
+    file = os.path.basename(full_path)
+    ext = file.lower().split('.')[-1]
+    result = {"file": file, "kind": ext, "data": None, "tokens": 0, "pages": [0],
+              "bytes": 0, "sha256": None, "error": None}
+    try:
+        # Inside the try: a file removed since the listing is reported in `error`
+        result["bytes"] = os.path.getsize(full_path)
+        if ext in TEXT_EXTENSIONS:
+            # Read once: the digest is that of the bytes actually parsed (cache key)
+            with open(full_path, 'rb') as f:
+                raw = f.read()
+            result["sha256"] = hashlib.sha256(raw).hexdigest()
+            if ext == 'txt':
+                result["data"] = io.TextIOWrapper(io.BytesIO(raw), encoding='utf-8').read()
+            else:
+                result["data"], result["pages"] = join_pages(pdf_pages(io.BytesIO(raw)))
+        elif ext in IMAGE_EXTENSIONS:
+            result["kind"] = 'image'
+            result["sha256"], result["data"] = encode_image(full_path)
+        if result["kind"] != 'image':
+            result["tokens"] = count_tokens(result["data"], model, mode)
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+# ---- Extraction cache --------------------------------
+def init_cache(db_path):
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS extractions (
+            sha256 TEXT,
+            extractor TEXT,
+            text TEXT,
+            pages TEXT,
+            tokens INTEGER,
+            size INTEGER,
+            last_used REAL,
+            PRIMARY KEY (sha256, extractor)
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS extractions_last_used ON extractions(last_used)')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS files (
+            path TEXT PRIMARY KEY,
+            mtime REAL,
+            size INTEGER,
+            sha256 TEXT
+        )
+    ''')
+    conn.commit()
+    conn.close()
+
+
+def file_digest(db_path, full_path):
+    # SHA-256 of the file; not re-hashed while its path, mtime and size are unchanged
+    st = os.stat(full_path)
+    path = os.path.abspath(full_path)
+    conn = sqlite3.connect(db_path)
+    row = conn.execute('SELECT mtime, size, sha256 FROM files WHERE path=?', (path,)).fetchone()
+    if row and row[0] == st.st_mtime and row[1] == st.st_size:
+        conn.close()
+        return row[2]
+    digest = OllamaImages.file_sha256(full_path)
+    conn.execute('INSERT OR REPLACE INTO files (path, mtime, size, sha256) VALUES (?, ?, ?, ?)',
+                 (path, st.st_mtime, st.st_size, digest))
+    conn.commit()
+    conn.close()
+    return digest
+
+
+def get_cached(db_path, digest, extractor):
+    # Returns {"text", "pages", "tokens"} or None
+    conn = sqlite3.connect(db_path)
+    row = conn.execute('SELECT text, pages, tokens FROM extractions WHERE sha256=? AND extractor=?',
+                       (digest, extractor)).fetchone()
+    if row:
+        conn.execute('UPDATE extractions SET last_used=? WHERE sha256=? AND extractor=?',
+                     (time.time(), digest, extractor))
+        conn.commit()
+    conn.close()
+    if row is None:
+        return None
+    return {"text": row[0], "pages": json.loads(row[1]), "tokens": row[2]}
+
+
+def save_cached(db_path, digest, extractor, text, pages, tokens):
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute('''
+        INSERT OR REPLACE INTO extractions (sha256, extractor, text, pages, tokens, size, last_used)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (digest, extractor, text, json.dumps(pages), tokens, len(text.encode('utf-8')), time.time()))
+    # LRU eviction beyond CACHE_MAX_BYTES of extracted text
+    total = 0
+    evicted = []
+    for key, extractor_name, size in c.execute(
+            'SELECT sha256, extractor, size FROM extractions ORDER BY last_used DESC').fetchall():
+        total += size
+        if total > CACHE_MAX_BYTES:
+            evicted.append((key, extractor_name))
+    c.executemany('DELETE FROM extractions WHERE sha256=? AND extractor=?', evicted)
+    conn.commit()
+    conn.close()
+
+
+def extract_cached(full_path, extractor, extract_pages, db_path=None, model=None):
+    # Cached call of extract_pages(full_path) -> [page texts];
+    # returns {"text", "pages", "tokens"}. db_path=None bypasses the cache.
+    digest = None
+    key = cache_key(extractor, model)
+    if db_path:
+        init_cache(db_path)
+        digest = file_digest(db_path, full_path)
+        entry = get_cached(db_path, digest, key)
+        if entry is not None:
+            return entry
+    text, pages = join_pages(extract_pages(full_path))
+    entry = {"text": text, "pages": pages, "tokens": count_tokens(text, model)}
+    if db_path:
+        save_cached(db_path, digest, key, text, pages, entry["tokens"])
+    return entry
+
+
+def load_documents(paths, workers=None, cache_db=None, model=None):
+    # Parse `paths` with a process pool; returns the results in the order of `paths`.
+    # With cache_db, text documents found in the extraction cache are not parsed again.
+    # Token counts use `model` with the OllamaTokens counter in use (see configure())
+    workers = workers or os.cpu_count() or 1
+    mode = OllamaTokens.MODE
+    results = [None] * len(paths)
+    start = time.perf_counter()
+    total_bytes = 0
+    done = 0
+    hits = 0
+    failed = 0
+
+    def report(final=False):
+        elapsed = max(time.perf_counter() - start, 1e-6)
+        cached = f", {hits} from cache" if cache_db else ""
+        errors = f", {failed} failed" if failed else ""
+        print(f"{'Ingested' if final else 'Progress'}: {done - failed}/{len(paths)} files{cached}{errors}, "
+              f"{total_bytes / 1e6:.1f} MB in {elapsed:.1f}s "
+              f"({done / elapsed:.1f} files/s, {total_bytes / 1e6 / elapsed:.1f} MB/s)")
+
+    todo = []
+    digests = {}
+    if cache_db:
+        init_cache(cache_db)
+    for i, path in enumerate(paths):
+        ext = path.lower().split('.')[-1]
+        if cache_db and ext in TEXT_EXTENSIONS:
+            try:
+                digests[i] = file_digest(cache_db, path)
+                entry = get_cached(cache_db, digests[i], cache_key(EXTRACTORS[ext], model, mode))
+                size = os.path.getsize(path)
+            except Exception as e:
+                print(f"Extraction cache unavailable for {path}: {e}")
+                entry = None
+            if entry is not None:
+                results[i] = {"file": os.path.basename(path), "kind": ext, "data": entry["text"],
+                              "tokens": entry["tokens"], "pages": entry["pages"],
+                              "bytes": size, "sha256": digests[i], "error": None}
+                total_bytes += results[i]["bytes"]
+                done += 1
+                hits += 1
+                continue
+        todo.append(i)
+
+    def store(i, result):
+        nonlocal total_bytes, done, failed
+        results[i] = result
+        total_bytes += result["bytes"]
+        done += 1
+        if result["error"] is not None:
+            failed += 1
+        elif cache_db and result["kind"] in EXTRACTORS:
+            # Keyed by the worker's digest: a file changed after the lookup is not cached under the old one
+            save_cached(cache_db, result["sha256"], cache_key(EXTRACTORS[result["kind"]], model, mode),
+                        result["data"], result["pages"], result["tokens"])
+
+    if workers == 1 or len(todo) < 2:
+        for i in todo:
+            store(i, load_document(paths[i], model, mode))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(todo))) as executor:
+            futures = {executor.submit(load_document, paths[i], model, mode): i for i in todo}
+            for future in as_completed(futures):
+                store(futures[future], future.result())
+                if done % PROGRESS_EVERY == 0 and done < len(paths):
+                    report()
+    report(final=True)
+    return results
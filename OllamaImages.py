@@ -0,0 +1,170 @@
+# Author(s): Dr. Patrick Lemoine
+# Image helpers for the vision scripts. Images are downscaled to the vision
+# model's native resolution and re-encoded as quality-bounded JPEG (or WebP)
+# before base64, identical images are sent once, encodings are cached by file
+# SHA-256 (in memory and in a small SQLite file), and first answers about a
+# picture are cached by (hash, model, question, temperature).
+
+import io
+import os
+import base64
+import hashlib
+import sqlite3
+import threading
+from PIL import Image, ImageOps
+
+
+IMAGE_CACHE_DB = "image_cache.db"
+
+# Longest side accepted natively by the vision encoders (larger images are
+# only tiled or downscaled again on the server)
+VISION_MAX_SIDE = {
+    "llama3.2-vision": 1120,
+    "llava": 672,
+    "bakllava": 672,
+    "moondream": 756,
+    "minicpm-v": 1344,
+    "qwen2.5vl": 1024,
+    "gemma3": 896,
+}
+DEFAULT_MAX_SIDE = 1024
+JPEG_QUALITY = 85
+IMAGE_FORMAT = "JPEG"
+
+_encodings = {}
+_lock = threading.Lock()
+
+
+def max_side_for_model(model_name):
+    base = model_name.split(":")[0]
+    return VISION_MAX_SIDE.get(base, DEFAULT_MAX_SIDE)
+
+
+def prepare_image_bytes(image_bytes, max_side=DEFAULT_MAX_SIDE, quality=JPEG_QUALITY, fmt=IMAGE_FORMAT):
+    # Downscale to max_side and re-encode; keeps the original bytes if it is
+    # already small enough and smaller than the re-encoded version
+    try:
+        img = Image.open(io.BytesIO(image_bytes))
+        # exif_transpose returns a copy without `format`: read it (and the orientation) first
+        source_format = img.format
+        upright = img.getexif().get(0x0112, 1) == 1
+        img = ImageOps.exif_transpose(img)
+    except Exception as e:
+        print(f"Image preprocessing skipped: {e}")
+        return image_bytes
+    original_fits = max(img.size) <= max_side and source_format in ("JPEG", "PNG") and upright
+    if img.mode not in ("RGB", "L"):
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        if img.mode in ("RGBA", "LA") or "transparency" in img.info:
+            rgba = img.convert("RGBA")
+            background.paste(rgba, mask=rgba.split()[-1])
+        else:
+            background.paste(img.convert("RGB"))
+        img = background
+    if max(img.size) > max_side:
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+    out = io.BytesIO()
+    img.save(out, format=fmt, quality=quality, optimize=True)
+    data = out.getvalue()
+    if original_fits and len(image_bytes) <= len(data):
+        return image_bytes
+    return data
+
+
+def encode_images_dedup(images_bytes, max_side=DEFAULT_MAX_SIDE, quality=JPEG_QUALITY):
+    # Preprocess and base64 a list of images, sending identical images only once
+    seen = set()
+    encoded = []
+    for image_bytes in images_bytes:
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        if digest in seen:
+            continue
+        seen.add(digest)
+        encoded.append(base64.b64encode(prepare_image_bytes(image_bytes, max_side, quality)).decode("utf-8"))
+    return encoded
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def init_cache(db_path):
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS encodings (
+            sha256 TEXT PRIMARY KEY,
+            b64 TEXT
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS answers (
+            sha256 TEXT,
+            model TEXT,
+            question TEXT,
+            temperature REAL,
+            answer TEXT,
+            PRIMARY KEY (sha256, model, question, temperature)
+        )
+    ''')
+    conn.commit()
+    conn.close()
+
+
+def encode_image_cached(image_path, db_path=None, max_side=DEFAULT_MAX_SIDE, quality=JPEG_QUALITY):
+    # Returns (sha256 of the file, base64 of the prepared image) or (None, None)
+    if not os.path.isfile(image_path):
+        print(f"Error: The file '{image_path}' could not be found.")
+        return None, None
+    digest = file_sha256(image_path)
+    key = f"{digest}:{max_side}:{quality}"
+    with _lock:
+        if key in _encodings:
+            return digest, _encodings[key]
+    b64 = None
+    if db_path:
+        init_cache(db_path)
+        conn = sqlite3.connect(db_path)
+        row = conn.execute('SELECT b64 FROM encodings WHERE sha256=?', (key,)).fetchone()
+        conn.close()
+        b64 = row[0] if row else None
+    if b64 is None:
+        with open(image_path, "rb") as f:
+            image_bytes = f.read()
+        prepared = prepare_image_bytes(image_bytes, max_side, quality)
+        print(f"Image prepared: {len(image_bytes) // 1024} KB -> {len(prepared) // 1024} KB")
+        b64 = base64.b64encode(prepared).decode("utf-8")
+        if db_path:
+            conn = sqlite3.connect(db_path)
+            conn.execute('INSERT OR REPLACE INTO encodings (sha256, b64) VALUES (?, ?)', (key, b64))
+            conn.commit()
+            conn.close()
+    with _lock:
+        _encodings[key] = b64
+    return digest, b64
+
+
+def get_cached_answer(db_path, digest, model, question, temperature):
+    init_cache(db_path)
+    conn = sqlite3.connect(db_path)
+    row = conn.execute(
+        'SELECT answer FROM answers WHERE sha256=? AND model=? AND question=? AND temperature=?',
+        (digest, model, question, temperature)
+    ).fetchone()
+    conn.close()
+    return row[0] if row else None
+
+
+def save_cached_answer(db_path, digest, model, question, temperature, answer):
+    init_cache(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        'INSERT OR REPLACE INTO answers (sha256, model, question, temperature, answer) VALUES (?, ?, ?, ?, ?)',
+        (digest, model, question, temperature, answer)
+    )
+    conn.commit()
+    conn.close()
@@ -0,0 +1,265 @@
+# Author(s): Dr. Patrick Lemoine
+# Keyword search over the .txt corpus for the SQLite enrichment scripts.
+# The `recherches` table caches keyword -> file list; lookups go through a
+# persistent SQLite FTS5 inverted index that is refreshed incrementally
+# (only files whose mtime or size changed are re-read). The index is
+# contentless: it keeps the postings, not a copy of the corpus. When the index
+# changes, cached results touched by the changed files are patched and the
+# corpus generation is bumped; entries also expire (TTL) and the table is
+# kept to a bounded size (LRU).
+
+import os
+import json
+import time
+import sqlite3
+
+
+FTS_TOKENIZER = "unicode61 remove_diacritics 0"
+COMMIT_EVERY = 500
+SCHEMA_VERSION = 2              # older indexes are dropped and rebuilt
+# A contentless FTS5 table cannot forget the postings of a modified or deleted
+# file: they stay as orphan rowids (filtered out by the join on `fichiers`)
+# until they outnumber the indexed files, then the index is rebuilt.
+ORPHANS_MIN = 1000
+
+SCAN_INTERVAL = 60              # seconds between two mtime/size scans of the corpus
+CACHE_TTL = 7 * 24 * 3600       # seconds before a cached result is recomputed
+CACHE_MAX_ENTRIES = 10000       # least recently used entries beyond this are evicted
+
+
+# ---- Gestion SQLite pour keywords ---------------------
+def cache_key(keywords):
+    return "_".join(sorted(set(keywords))).lower()
+
+def init_db(db_path):
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    if c.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+        # Index storing the full text of the corpus: rebuild it contentless
+        for table in ('fichiers_fts', 'fichiers', 'recherches', 'corpus_state'):
+            c.execute(f'DROP TABLE IF EXISTS {table}')
+        c.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    columns = [row[1] for row in c.execute('PRAGMA table_info(recherches)')]
+    if columns and 'generation' not in columns:
+        # Cache from an older version: no fingerprint, start again
+        c.execute('DROP TABLE recherches')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS recherches (
+            keywords TEXT PRIMARY KEY,
+            keywords_list TEXT,
+            result TEXT,
+            generation INTEGER,
+            created REAL,
+            last_used REAL
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS recherches_last_used ON recherches(last_used)')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS corpus_state (
+            name TEXT PRIMARY KEY,
+            value REAL
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS fichiers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            path TEXT UNIQUE,
+            mtime REAL,
+            size INTEGER
+        )
+    ''')
+    c.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS fichiers_fts
+        USING fts5(contenu, content='', tokenize="{FTS_TOKENIZER}")
+    ''')
+    conn.commit()
+    conn.close()
+
+def get_state(db_path, name, default=0):
+    conn = sqlite3.connect(db_path)
+    row = conn.execute('SELECT value FROM corpus_state WHERE name=?', (name,)).fetchone()
+    conn.close()
+    return row[0] if row else default
+
+def set_state(db_path, name, value):
+    conn = sqlite3.connect(db_path)
+    conn.execute('INSERT OR REPLACE INTO corpus_state (name, value) VALUES (?, ?)', (name, value))
+    conn.commit()
+    conn.close()
+
+def mark_corpus_changed(path, db_path="resultats.db"):
+    # Force a rescan on the next lookup (e.g. after writing new files into the corpus)
+    db_path = path+"/"+db_path
+    init_db(db_path)
+    set_state(db_path, 'last_scan', 0)
+
+def query_db(db_path, keywords):
+    key = cache_key(keywords)
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute('SELECT result, created FROM recherches WHERE keywords=?', (key,))
+    row = c.fetchone()
+    result = None
+    if row and time.time() - row[1] < CACHE_TTL:
+        c.execute('UPDATE recherches SET last_used=? WHERE keywords=?', (time.time(), key))
+        conn.commit()
+        result = json.loads(row[0])
+    conn.close()
+    return result
+
+def insert_db(db_path, keywords, results):
+    key = cache_key(keywords)
+    now = time.time()
+    generation = get_state(db_path, 'generation')
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute('''
+        INSERT OR REPLACE INTO recherches (keywords, keywords_list, result, generation, created, last_used)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (key, json.dumps(keywords), json.dumps(results), generation, now, now))
+    # LRU eviction
+    c.execute('''
+        DELETE FROM recherches WHERE keywords IN (
+            SELECT keywords FROM recherches ORDER BY last_used DESC LIMIT -1 OFFSET ?
+        )
+    ''', (CACHE_MAX_ENTRIES,))
+    conn.commit()
+    conn.close()
+
+def refresh_cache(db_path, changed, deleted):
+    # Patch the cached results affected by the changed (id -> path) and deleted (paths) files
+    stale = set(changed.values()) | set(deleted)
+    generation = get_state(db_path, 'generation') + 1
+    set_state(db_path, 'generation', generation)
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    refreshed = 0
+    ids = ",".join(str(i) for i in changed)
+    for key, keywords_list, result in c.execute('SELECT keywords, keywords_list, result FROM recherches').fetchall():
+        old = json.loads(result)
+        new = [p for p in old if p not in stale]
+        match = fts_match(json.loads(keywords_list))
+        if changed and match:
+            new += [row[0] for row in c.execute(f'''
+                SELECT f.path FROM fichiers_fts
+                JOIN fichiers f ON f.id = fichiers_fts.rowid
+                WHERE fichiers_fts MATCH ? AND fichiers_fts.rowid IN ({ids})
+            ''', (match,))]
+        new = sorted(new)
+        if new != sorted(old):
+            refreshed += 1
+            c.execute('UPDATE recherches SET result=?, generation=? WHERE keywords=?',
+                      (json.dumps(new), generation, key))
+    conn.commit()
+    conn.close()
+    return refreshed
+
+
+# ---- Index plein texte (FTS5) --------------------------
+def update_index(db_path, path):
+    # Re-index new or modified .txt files, drop deleted ones.
+    # Returns ({id: path} of (re)indexed files, [paths] of deleted files).
+    # A modified file gets a new id (AUTOINCREMENT ids are never reused), so the
+    # orphan postings of its previous version can no longer match.
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    known = {p: (i, m, s) for i, p, m, s in c.execute('SELECT id, path, mtime, size FROM fichiers')}
+    seen = set()
+    changed = {}
+    orphans = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            if not file.endswith('.txt'):
+                continue
+            chemin = os.path.join(root, file)
+            seen.add(chemin)
+            try:
+                st = os.stat(chemin)
+                entry = known.get(chemin)
+                if entry and entry[1] == st.st_mtime and entry[2] == st.st_size:
+                    continue
+                with open(chemin, "r", encoding="utf-8") as f:
+                    contenu = f.read()
+                if entry:
+                    c.execute('DELETE FROM fichiers WHERE id=?', (entry[0],))
+                    orphans += 1
+                c.execute('INSERT INTO fichiers (path, mtime, size) VALUES (?, ?, ?)',
+                          (chemin, st.st_mtime, st.st_size))
+                file_id = c.lastrowid
+                c.execute('INSERT INTO fichiers_fts (rowid, contenu) VALUES (?, ?)', (file_id, contenu))
+                changed[file_id] = chemin
+                if len(changed) % COMMIT_EVERY == 0:
+                    conn.commit()
+            except Exception as e:
+                print(f"Error path {chemin}: {e}")
+    deleted = sorted(set(known) - seen)
+    for chemin in deleted:
+        c.execute('DELETE FROM fichiers WHERE id=?', (known[chemin][0],))
+    orphans += len(deleted)
+    conn.commit()
+    conn.close()
+    if orphans:
+        set_state(db_path, 'orphans', get_state(db_path, 'orphans') + orphans)
+    return changed, deleted
+
+def compact_index(db_path):
+    # Rebuild the contentless index once the orphan postings outnumber the files
+    conn = sqlite3.connect(db_path)
+    indexed = conn.execute('SELECT COUNT(*) FROM fichiers').fetchone()[0]
+    conn.close()
+    if get_state(db_path, 'orphans') <= max(ORPHANS_MIN, indexed):
+        return False
+    print("Rebuilding the .txt full-text index (stale postings)...")
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO fichiers_fts (fichiers_fts) VALUES ('delete-all')")
+    conn.execute('DELETE FROM fichiers')
+    conn.commit()
+    conn.close()
+    set_state(db_path, 'orphans', 0)
+    return True
+
+def fts_match(keywords):
+    # AND of keywords; each keyword is matched as a phrase (multi-word names),
+    # case-insensitively, the last word as a prefix ("Ein" finds "Einstein")
+    return " AND ".join('"' + k.replace('"', '""') + '" *' for k in keywords if k.strip())
+
+def search_index(db_path, keywords):
+    match = fts_match(keywords)
+    if not match:
+        return []
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute('''
+        SELECT f.path FROM fichiers_fts
+        JOIN fichiers f ON f.id = fichiers_fts.rowid
+        WHERE fichiers_fts MATCH ?
+        ORDER BY f.path
+    ''', (match,))
+    result_paths = [row[0] for row in c.fetchall()]
+    conn.close()
+    return result_paths
+
+def sync_index(db_path, path):
+    print("Updating the .txt full-text index...")
+    changed, deleted = update_index(db_path, path)
+    if compact_index(db_path):
+        # Every file is indexed again under a new id
+        changed, _ = update_index(db_path, path)
+    set_state(db_path, 'last_scan', time.time())
+    if changed or deleted:
+        print(f"{len(changed)} file(s) (re)indexed, {len(deleted)} removed.")
+        refreshed = refresh_cache(db_path, changed, deleted)
+        print(f"{refreshed} cached search(es) refreshed.")
+
+def recherche_fichiers_keywords_sqlite(path, keywords, db_path="resultats.db"):
+    db_path = path+"/"+db_path
+    init_db(db_path)
+    if time.time() - get_state(db_path, 'last_scan') >= SCAN_INTERVAL:
+        sync_index(db_path, path)
+    result = query_db(db_path, keywords)
+    if result is not None:
+        print("Query found in SQLite database.")
+        return result
+    result_paths = search_index(db_path, keywords)
+    insert_db(db_path, keywords, result_paths)
+    return result_paths
@@ -0,0 +1,194 @@
+# Author(s): Dr. Patrick Lemoine
+# Per-request metrics. Every /api/generate, /api/chat and /api/embed call made
+# through OllamaClient (requests session, NDJSON streams and the pooled
+# ollama.Client) is recorded with the durations and counts returned by Ollama
+# and the client-side wall time. Records go to a SQLite table and/or a
+# Prometheus text file (node_exporter textfile collector format).
+# `python OllamaMetrics.py` prints tokens/s per model and the prompt-eval cost
+# per conversation turn.
+
+import os
+import sys
+import time
+import sqlite3
+import threading
+
+
+EXPORT = os.getenv("OLLAMA_METRICS", "sqlite")                  # sqlite, prometheus, both or off
+METRICS_DB = os.getenv("OLLAMA_METRICS_DB", "ollama_metrics.db")
+PROM_PATH = os.getenv("OLLAMA_METRICS_PROM", "ollama_metrics.prom")
+METERED_PATHS = ("/api/generate", "/api/chat", "/api/embed")
+
+FIELDS = ("total_duration", "load_duration", "prompt_eval_count", "prompt_eval_duration",
+          "eval_count", "eval_duration")
+
+SCRIPT = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0]
+SESSION = f"{SCRIPT}-{time.strftime('%Y%m%d_%H%M%S')}-{os.getpid()}"
+
+_lock = threading.Lock()
+_turn = 0
+_db_ready = False
+_totals = {}        # (model, endpoint) -> {"requests", "wall", fields...}
+
+
+def configure(export=None, db_path=None, prom_path=None, session=None):
+    global EXPORT, METRICS_DB, PROM_PATH, SESSION, _db_ready
+    if export is not None:
+        EXPORT = export
+    if db_path is not None:
+        METRICS_DB = db_path
+        _db_ready = False
+    if prom_path is not None:
+        PROM_PATH = prom_path
+    if session is not None:
+        SESSION = session
+
+
+def endpoint_of(url):
+    for path in METERED_PATHS:
+        if url.rstrip("/").endswith(path):
+            return path
+    return None
+
+
+def init_db(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS requests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts REAL,
+            script TEXT,
+            session TEXT,
+            turn INTEGER,
+            endpoint TEXT,
+            model TEXT,
+            status INTEGER,
+            wall REAL,
+            total_duration INTEGER,
+            load_duration INTEGER,
+            prompt_eval_count INTEGER,
+            prompt_eval_duration INTEGER,
+            eval_count INTEGER,
+            eval_duration INTEGER
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS requests_model ON requests(model)')
+    conn.execute('CREATE INDEX IF NOT EXISTS requests_session ON requests(session)')
+    conn.commit()
+    conn.close()
+
+
+def record(url, model, stats, wall, status=200):
+    # stats: final JSON object (or last NDJSON chunk) returned by Ollama; wall in seconds
+    global _turn, _db_ready
+    endpoint = endpoint_of(url)
+    if EXPORT == "off" or endpoint is None:
+        return
+    stats = stats if isinstance(stats, dict) else {}
+    values = [int(stats.get(field) or 0) for field in FIELDS]
+    model = model or stats.get("model", "")
+    try:
+        with _lock:
+            _turn += 1
+            totals = _totals.setdefault((model, endpoint), dict.fromkeys(("requests", "wall") + FIELDS, 0))
+            totals["requests"] += 1
+            totals["wall"] += wall
+            for field, value in zip(FIELDS, values):
+                totals[field] += value
+            if EXPORT in ("sqlite", "both"):
+                if not _db_ready:
+                    init_db(METRICS_DB)
+                    _db_ready = True
+                conn = sqlite3.connect(METRICS_DB)
+                conn.execute(f'''
+                    INSERT INTO requests (ts, script, session, turn, endpoint, model, status, wall, {", ".join(FIELDS)})
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, {", ".join("?" * len(FIELDS))})
+                ''', [time.time(), SCRIPT, SESSION, _turn, endpoint, model, status, wall] + values)
+                conn.commit()
+                conn.close()
+            if EXPORT in ("prometheus", "both"):
+                write_prometheus(PROM_PATH)
+    except Exception as e:
+        # Metrics must never break a request
+        print(f"Metrics not recorded: {e}")
+
+
+def record_json(url, request_json, response, wall):
+    # Non-streamed requests response: body already in memory
+    if endpoint_of(url) is None or EXPORT == "off":
+        return
+    try:
+        stats = response.json() if response.status_code == 200 else {}
+    except ValueError:
+        stats = {}
+    record(url, (request_json or {}).get("model"), stats, wall, response.status_code)
+
+
+def write_prometheus(path):
+    # Counters of this process, written atomically (textfile collector format)
+    metrics = [
+        ("ollama_requests_total", "requests", 1, "Requests sent to Ollama"),
+        ("ollama_wall_seconds_total", "wall", 1, "Client-side wall time"),
+        ("ollama_total_seconds_total", "total_duration", 1e-9, "Server total_duration"),
+        ("ollama_load_seconds_total", "load_duration", 1e-9, "Model load time"),
+        ("ollama_prompt_tokens_total", "prompt_eval_count", 1, "Prompt tokens evaluated"),
+        ("ollama_prompt_eval_seconds_total", "prompt_eval_duration", 1e-9, "Prompt evaluation time"),
+        ("ollama_eval_tokens_total", "eval_count", 1, "Tokens generated"),
+        ("ollama_eval_seconds_total", "eval_duration", 1e-9, "Generation time"),
+    ]
+    lines = []
+    for name, key, scale, help_text in metrics:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        for (model, endpoint), totals in sorted(_totals.items()):
+            labels = f'script="{SCRIPT}",model="{model}",endpoint="{endpoint}"'
+            lines.append(f"{name}{{{labels}}} {totals[key] * scale:.6g}")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
+
+
+def model_report(db_path=METRICS_DB):
+    init_db(db_path)
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute('''
+        SELECT model, endpoint, COUNT(*), AVG(wall), SUM(eval_count), SUM(eval_duration),
+               SUM(prompt_eval_count), SUM(prompt_eval_duration), AVG(load_duration)
+        FROM requests GROUP BY model, endpoint ORDER BY model, endpoint
+    ''').fetchall()
+    conn.close()
+    print(f"{'model':30s} {'endpoint':14s} {'req':>5s} {'wall s':>7s} {'gen tok/s':>10s} {'prompt tok/s':>13s} {'load s':>7s}")
+    for model, endpoint, count, wall, eval_count, eval_ns, prompt_count, prompt_ns, load_ns in rows:
+        gen_rate = eval_count / (eval_ns / 1e9) if eval_ns else 0.0
+        prompt_rate = prompt_count / (prompt_ns / 1e9) if prompt_ns else 0.0
+        print(f"{model:30s} {endpoint:14s} {count:5d} {wall:7.2f} {gen_rate:10.1f} {prompt_rate:13.1f} {(load_ns or 0) / 1e9:7.2f}")
+
+
+def session_report(db_path=METRICS_DB, session=None):
+    # Prompt-eval cost of each turn of one session (the latest by default)
+    init_db(db_path)
+    conn = sqlite3.connect(db_path)
+    if session is None:
+        row = conn.execute('SELECT session FROM requests ORDER BY id DESC LIMIT 1').fetchone()
+        session = row[0] if row else None
+    rows = conn.execute('''
+        SELECT turn, endpoint, model, prompt_eval_count, prompt_eval_duration, eval_count, wall
+        FROM requests WHERE session=? ORDER BY turn
+    ''', (session,)).fetchall()
+    conn.close()
+    print(f"\nSession {session}")
+    print(f"{'turn':>4s} {'endpoint':14s} {'model':30s} {'prompt tok':>10s} {'prompt s':>9s} {'gen tok':>8s} {'wall s':>7s}")
+    for turn, endpoint, model, prompt_count, prompt_ns, eval_count, wall in rows:
+        print(f"{turn:4d} {endpoint:14s} {model:30s} {prompt_count:10d} {prompt_ns / 1e9:9.2f} {eval_count:8d} {wall:7.2f}")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Report the Ollama request metrics.")
+    parser.add_argument('--Database', type=str, default=METRICS_DB, help='Metrics SQLite file')
+    parser.add_argument('--Session', type=str, default=None, help='Session for the per-turn report (default: latest)')
+    args = parser.parse_args()
+
+    model_report(args.Database)
+    session_report(args.Database, args.Session)
@@ -6,7 +6,8 @@ import ollama
 import json
 import subprocess
 import psutil
-import requests
+import OllamaClient
+import OllamaModelRegistry
 from datetime import datetime
 import keyboard
 
@@ -51,6 +52,9 @@ def is_ollama_running():
     return False
 
 def launch_ollama_if_needed():
+    if OllamaClient.is_server_ready():
+        print("Ollama is already running.")
+        return
     path = load_path_from_json()
     if path is None or not os.path.isfile(path):
         path = find_ollama_executable()
@@ -59,32 +63,35 @@ def launch_ollama_if_needed():
         else:
             print("Ollama.exe not found on the system.")
             return
+    # Not answering yet: the process scan tells a booting server from a stopped one
     if not is_ollama_running():
         # Start Ollama server (add 'serve' argument if necessary)
         subprocess.Popen([path, "serve"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         print(f"Launching Ollama from: {path}")
-    else:
-        print("Ollama is already running.")
+    if not OllamaClient.wait_until_ready():
+        print(f"Ollama server not answering at {OllamaClient.OLLAMA_BASE_URL}.")
 
 
 def create_model_with_text(model_name: str, long_text: str):
     system_prompt = f"You are an expert on the following text. Use it to answer questions:\n{long_text}"
-    ollama.create(
-        model=model_name,
-        from_="qwen2.5-coder:7b",
-        system=system_prompt,
-        parameters={
+    # Skipped when the same corpus/parameters were already baked into a model
+    model_name = OllamaModelRegistry.create_or_reuse(
+        model_name,
+        "qwen2.5-coder:7b",
+        system_prompt,
+        {
             "temperature": 0.7,
             "num_ctx": 4096
             #"num_ctx": 8192
             #"num_ctx":  9000
         }
     )
-    print(f"Model '{model_name}' created successfully.")
+    print(f"Model '{model_name}' ready.")
+    return model_name
 
 def ask_question(model_name: str, question: str):
     messages = [{"role": "user", "content": question}]
-    response = ollama.chat(model=model_name, messages=messages)
+    response = OllamaClient.get_ollama_client().chat(model=model_name, messages=messages)
     print("Réponse :", response['message']['content'])
 
 
@@ -95,7 +102,7 @@ def parent_path(path):
 def list_models():
     try:
         url = f"{OLLAMA_BASE_URL}/api/tags"  
-        response = requests.get(url)
+        response = OllamaClient.get(url)
         if response.status_code == 200:
             models = response.json().get("models", [])
             return [m["name"] for m in models]
@@ -110,7 +117,7 @@ def list_models():
 def list_models():
     try:
         url = f"{OLLAMA_BASE_URL}/api/tags" 
-        response = requests.get(url)
+        response = OllamaClient.get(url)
         if response.status_code == 200:
             models = response.json().get("models", [])
             return [m["name"] for m in models]
@@ -156,9 +163,9 @@ if __name__ == "__main__":
     #    return
     
     
-    create_model_with_text(NAME_NEW_MODEL, FileData)
+    model_name = create_model_with_text(NAME_NEW_MODEL, FileData)
     
-    ask_question(NAME_NEW_MODEL, "Hello ")
+    ask_question(model_name, "Hello ")
     
     print("Press ESC to continue...")
     keyboard.wait('esc')
@@ -6,10 +6,14 @@ import ollama
 import json
 import subprocess
 import psutil
-import requests
+import OllamaClient
+import OllamaBatch
+import OllamaModelRegistry
+import OllamaTokens
+import OllamaDocuments
+import OllamaRetrieval
 from datetime import datetime
 import PyPDF2
-import re
 import keyboard
 
 JSON_PATH = "ollama_path.json"
@@ -48,6 +52,9 @@ def is_ollama_running():
     return False
 
 def launch_ollama_if_needed():
+    if OllamaClient.is_server_ready():
+        print("Ollama is already running.")
+        return
     path = load_path_from_json()
     if path is None or not os.path.isfile(path):
         path = find_ollama_executable()
@@ -56,31 +63,34 @@ def launch_ollama_if_needed():
         else:
             print("Ollama.exe not found on the system.")
             return
+    # Not answering yet: the process scan tells a booting server from a stopped one
     if not is_ollama_running():
         subprocess.Popen([path, "serve"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         print(f"Launching Ollama from: {path}")
-    else:
-        print("Ollama is already running.")
+    if not OllamaClient.wait_until_ready():
+        print(f"Ollama server not answering at {OllamaClient.OLLAMA_BASE_URL}.")
 
 def create_model_with_text(model_name: str, long_text: str, nb_tokens):
     system_prompt = f"You are an expert on the following text. Use it to answer questions:\n{long_text}"
-    ollama.create(
-        model=model_name,
-        from_="qwen2.5-coder:7b",
-        system=system_prompt,
-        parameters={
+    # Skipped when the same corpus/parameters were already baked into a model
+    model_name = OllamaModelRegistry.create_or_reuse(
+        model_name,
+        "qwen2.5-coder:7b",
+        system_prompt,
+        {
             "temperature": 0.7,
             #"num_ctx": 4096
-            "num_ctx":nb_tokens
+            "num_ctx": OllamaTokens.num_ctx_for(nb_tokens, "qwen2.5-coder:7b")
         }
     )
-    print(f"Model '{model_name}' created successfully.")
+    print(f"Model '{model_name}' ready.")
+    return model_name
 
 def ask_question(model_name: str, question: str):
     messages = [{"role": "user", "content": question}]
     try:
         print(f"Sending the question to model '{model_name}' : {question}")
-        response = ollama.chat(model=model_name, messages=messages)
+        response = OllamaClient.get_ollama_client().chat(model=model_name, messages=messages)
         print("Raw full response :", response)
         if isinstance(response, dict):
             content = response.get('message', {}).get('content')
@@ -95,13 +105,10 @@ def ask_question(model_name: str, question: str):
 
 
 def count_tokens_in_txt(filepath):
-    with open(filepath, 'r', encoding='utf-8') as file:
-        text = file.read()
-    tokens = re.findall(r"\w+|[^\w\s]", text, re.UNICODE)
-    return len(tokens)
+    return OllamaTokens.count_file_tokens(filepath)
 
 
-def concat_txt_and_pdf_from_folder(folder_path):
+def concat_txt_and_pdf_from_folder(folder_path, workers=None, use_cache=True):
     all_text = []
     selected_files = []
     for file in os.listdir(folder_path):
@@ -111,32 +118,17 @@ def concat_txt_and_pdf_from_folder(folder_path):
         print("No .txt or .pdf files found in the folder :", folder_path)
         return ""
     print("Files detected :", selected_files)
-    for file in selected_files:
-        full_path = os.path.join(folder_path, file)
-        
-        print(f"File : {full_path}")
-        number_tokens = count_tokens_in_txt(full_path)
-        print(f"Number of tokens : {number_tokens}")
-        
-        
-        if file.lower().endswith('.txt'):
-            try:
-                with open(full_path, 'r', encoding='utf-8') as f:
-                    all_text.append(f"\n===== {file} =====\n")
-                    all_text.append(f.read())
-            except Exception as e:
-                print(f"Error reading TXT {file} : {e}")
-        elif file.lower().endswith('.pdf'):
-            try:
-                with open(full_path, 'rb') as pdf_file:
-                    pdf_reader = PyPDF2.PdfReader(pdf_file)
-                    content = []
-                    for page in pdf_reader.pages:
-                        content.append(page.extract_text() or "")
-                    all_text.append(f"\n===== {file} =====\n")
-                    all_text.append("\n".join(content))
-            except Exception as e:
-                print(f"Error reading PDF {file} : {e}")
+    # Parsed in parallel worker processes, reassembled in the original order
+    paths = [os.path.join(folder_path, file) for file in selected_files]
+    cache_db = os.path.join(folder_path, OllamaDocuments.DOCUMENT_CACHE_DB) if use_cache else None
+    for doc in OllamaDocuments.load_documents(paths, workers, cache_db):
+        print(f"File : {os.path.join(folder_path, doc['file'])}")
+        if doc["error"]:
+            print(f"Error reading {doc['kind'].upper()} {doc['file']} : {doc['error']}")
+            continue
+        print(f"Number of tokens : {doc['tokens']}")
+        all_text.append(f"\n===== {doc['file']} =====\n")
+        all_text.append(doc["data"])
     return '\n'.join(all_text)
 
 
@@ -144,7 +136,7 @@ def concat_txt_and_pdf_from_folder(folder_path):
 def list_models():
     try:
         url = f"{OLLAMA_BASE_URL}/api/tags"  # Endpoint for listing models
-        response = requests.get(url)
+        response = OllamaClient.get(url)
         if response.status_code == 200:
             models = response.json().get("models", [])
             return [m["name"] for m in models]
@@ -157,12 +149,27 @@ def list_models():
 
 if __name__ == "__main__":
     import argparse
+    import multiprocessing
+    multiprocessing.freeze_support()
     parser = argparse.ArgumentParser()
     parser.add_argument('--Path', type=str, default='.',
                         help='Folder containing .pdf and .txt files to load')
     parser.add_argument('--Model', type=str, default="qwen2.5-coder:7b", help='Name of the base model')
     parser.add_argument('--NameNewModel', type=str, default="long-text-expert-file", help='Name of the new model')
+    parser.add_argument('--Mode', type=str, default="model", choices=["model", "rag"],
+                        help='model: bake the corpus into a new model, rag: retrieve relevant chunks per question')
+    parser.add_argument('--EmbedModel', type=str, default="nomic-embed-text", help='Embedding model (rag mode)')
+    parser.add_argument('--TopK', type=int, default=5, help='Number of chunks injected per question (rag mode)')
+    parser.add_argument('--TokenCounter', type=str, default="estimate", choices=["estimate", "exact"],
+                        help='estimate: fast character-based count, exact: the model tokenizer (needs `tokenizers`)')
+    parser.add_argument('--Workers', type=int, default=0, help='Processes used to parse the files (0 = one per CPU)')
+    parser.add_argument('--NoCache', action='store_true', help='Re-extract every document, ignoring the extraction cache')
+    parser.add_argument('--Questions', type=str, default=None,
+                        help='Batch mode: JSONL file of questions answered without the interactive loop')
+    parser.add_argument('--Results', type=str, default=None, help='Batch results JSONL (default: <questions>.results.jsonl)')
+    parser.add_argument('--BatchWorkers', type=int, default=4, help='Questions sent to Ollama at the same time (batch mode)')
     args = parser.parse_args()
+    OllamaTokens.configure(args.TokenCounter)
 
     folder_path = os.path.abspath(args.Path)
     NAME_NEW_MODEL = args.NameNewModel
@@ -172,9 +179,9 @@ if __name__ == "__main__":
     
     
 
-    FileData = concat_txt_and_pdf_from_folder(folder_path)
+    FileData = concat_txt_and_pdf_from_folder(folder_path, args.Workers or None, not args.NoCache)
     
-    number_tokens = len(re.findall(r"\w+|[^\w\s]", FileData, re.UNICODE))
+    number_tokens = OllamaTokens.count_tokens(FileData, "qwen2.5-coder:7b")
     print(f"Number of tokens : {number_tokens}")
 
 
@@ -190,9 +197,26 @@ if __name__ == "__main__":
     
     models = list_models()
     
-    create_model_with_text(NAME_NEW_MODEL, FileData, int(number_tokens*1.1))
+    if args.Mode == "rag":
+        db_path = os.path.join(folder_path, "retrieval.db")
+        documents = OllamaRetrieval.split_sections(FileData, folder_path)
+        OllamaRetrieval.build_index(db_path, documents, args.EmbedModel, prune=True)
+        index = OllamaRetrieval.load_index(db_path, args.EmbedModel, sources=[source for source, _ in documents])
+        print(f"Retrieval index: {len(index['rows'])} chunks, base model {args.Model}")
+        if args.Questions:
+            OllamaBatch.run_batch(args.Questions, OllamaRetrieval.batch_answer_fn(args.Model, index, args.TopK),
+                                  args.Results, args.BatchWorkers)
+        else:
+            OllamaRetrieval.chat_with_retrieval(args.Model, index, args.TopK)
+        sys.exit(0)
+
+    model_name = create_model_with_text(NAME_NEW_MODEL, FileData, number_tokens)
+
+    if args.Questions:
+        OllamaBatch.run_batch(args.Questions, OllamaBatch.ask_model(model_name), args.Results, args.BatchWorkers)
+        sys.exit(0)
     
     print("\n--- Test du modèle ---")
-    ask_question(NAME_NEW_MODEL, "Hello.")
+    ask_question(model_name, "Hello.")
     print("\n--- Terminé ---")
     
\ No newline at end of file
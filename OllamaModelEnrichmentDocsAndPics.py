@@ -6,7 +6,11 @@ import ollama
 import json
 import subprocess
 import psutil
-import requests
+import OllamaClient
+import OllamaBatch
+import OllamaModelRegistry
+import OllamaImages
+import OllamaDocuments
 from datetime import datetime
 import PyPDF2
 import base64
@@ -47,6 +51,9 @@ def is_ollama_running():
     return False
 
 def launch_ollama_if_needed():
+    if OllamaClient.is_server_ready():
+        print("Ollama is already running.")
+        return
     path = load_path_from_json()
     if path is None or not os.path.isfile(path):
         path = find_ollama_executable()
@@ -55,25 +62,29 @@ def launch_ollama_if_needed():
         else:
             print("Ollama.exe not found on the system.")
             return
+    # Not answering yet: the process scan tells a booting server from a stopped one
     if not is_ollama_running():
         subprocess.Popen([path, "serve"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         print(f"Launching Ollama from: {path}")
-    else:
-        print("Ollama is already running.")
+    if not OllamaClient.wait_until_ready():
+        print(f"Ollama server not answering at {OllamaClient.OLLAMA_BASE_URL}.")
 
 def encode_image_to_base64(image_path):
     try:
         with open(image_path, 'rb') as img_file:
-            encoded_string = base64.b64encode(img_file.read()).decode('utf-8')
+            # Downscaled and re-encoded before base64 (see OllamaImages.py)
+            image_bytes = OllamaImages.prepare_image_bytes(img_file.read())
+            encoded_string = base64.b64encode(image_bytes).decode('utf-8')
             return encoded_string
     except Exception as e:
         print(f"Error encoding image {image_path}: {e}")
         return None
 
-def concat_txt_pdf_and_images_from_folder(folder_path):
+def concat_txt_pdf_and_images_from_folder(folder_path, workers=None, use_cache=True):
     all_text = []
     selected_files = []
     image_data_list = []
+    image_hashes = set()
     
     for file in os.listdir(folder_path):
         ext = file.lower().split('.')[-1]
@@ -84,49 +95,43 @@ def concat_txt_pdf_and_images_from_folder(folder_path):
         return "", []
     print("Detected files:", selected_files)
 
-    for file in selected_files:
-        full_path = os.path.join(folder_path, file)
-        ext = file.lower().split('.')[-1]
-        if ext == 'txt':
-            try:
-                with open(full_path, 'r', encoding='utf-8') as f:
-                    all_text.append(f"\n===== {file} =====\n")
-                    all_text.append(f.read())
-            except Exception as e:
-                print(f"TXT reading error {file}: {e}")
-        elif ext == 'pdf':
-            try:
-                with open(full_path, 'rb') as pdf_file:
-                    pdf_reader = PyPDF2.PdfReader(pdf_file)
-                    content = []
-                    for page in pdf_reader.pages:
-                        content.append(page.extract_text() or "")
-                    all_text.append(f"\n===== {file} =====\n")
-                    all_text.append("\n".join(content))
-            except Exception as e:
-                print(f"PDF reading error {file}: {e}")
-        elif ext in ['jpg', 'jpeg', 'png', 'bmp']:
-            encoded_img = encode_image_to_base64(full_path)
-            if encoded_img:
-                image_data_list.append((file, encoded_img))
-            else:
+    # Parsed/encoded in parallel worker processes, reassembled in the original order
+    paths = [os.path.join(folder_path, file) for file in selected_files]
+    cache_db = os.path.join(folder_path, OllamaDocuments.DOCUMENT_CACHE_DB) if use_cache else None
+    for doc in OllamaDocuments.load_documents(paths, workers, cache_db):
+        file = doc["file"]
+        if doc["kind"] == 'image':
+            if doc["error"] or not doc["data"]:
+                print(f"Error encoding image {file}: {doc['error']}")
                 print(f"Skipping image {file} due to encoding error.")
+            elif doc["sha256"] in image_hashes:
+                print(f"Skipping image {file}: identical to an image already loaded.")
+            else:
+                image_hashes.add(doc["sha256"])
+                image_data_list.append((file, doc["data"]))
+        elif doc["error"]:
+            print(f"{doc['kind'].upper()} reading error {file}: {doc['error']}")
+        else:
+            all_text.append(f"\n===== {file} =====\n")
+            all_text.append(doc["data"])
     return '\n'.join(all_text), image_data_list
 
 def create_model_with_text_and_images(model_name: str, long_text: str, images_base64: list):
     system_prompt = f"You are an expert on the following text. Use it to answer questions:\n{long_text}"
     images = [img_b64 for (_, img_b64) in images_base64]
-    ollama.create(
-        model=model_name,
-        from_="qwen2.5-coder:7b",
-        system=system_prompt,
-        parameters={
+    # Skipped when the same corpus/parameters were already baked into a model
+    model_name = OllamaModelRegistry.create_or_reuse(
+        model_name,
+        "qwen2.5-coder:7b",
+        system_prompt,
+        {
             "temperature": 0.7,
             #"num_ctx": 4096
             "num_ctx": 8192
         }
     )
-    print(f"Model '{model_name}' created successfully.")
+    print(f"Model '{model_name}' ready.")
+    return model_name
 
 def ask_question_with_images(model_name: str, question: str, images_base64: list):
     message = {
@@ -139,7 +144,7 @@ def ask_question_with_images(model_name: str, question: str, images_base64: list
     messages = [message]
     try:
         print(f"Sending question to the model '{model_name}': {question}")
-        response = ollama.chat(model=model_name, messages=messages)
+        response = OllamaClient.get_ollama_client().chat(model=model_name, messages=messages)
         print("Full raw response:", response)
         if isinstance(response, dict):
             content = response.get('message', {}).get('content')
@@ -156,7 +161,7 @@ def ask_question_with_images(model_name: str, question: str, images_base64: list
 def list_models():
     try:
         url = f"{OLLAMA_BASE_URL}/api/tags"  # Endpoint for listing models
-        response = requests.get(url)
+        response = OllamaClient.get(url)
         if response.status_code == 200:
             models = response.json().get("models", [])
             return [m["name"] for m in models]
@@ -170,11 +175,19 @@ def list_models():
 
 if __name__ == "__main__":
     import argparse
+    import multiprocessing
+    multiprocessing.freeze_support()
     parser = argparse.ArgumentParser()
     parser.add_argument('--Path', type=str, default='.',
                         help='Folder containing .pdf, .txt, and image files to load')
     parser.add_argument('--Model', type=str, default="qwen2.5-coder:7b", help='Base model name')
     parser.add_argument('--NameNewModel', type=str, default="long-text-expert-file", help='Name of the new model')
+    parser.add_argument('--Workers', type=int, default=0, help='Processes used to parse the files (0 = one per CPU)')
+    parser.add_argument('--NoCache', action='store_true', help='Re-extract every document, ignoring the extraction cache')
+    parser.add_argument('--Questions', type=str, default=None,
+                        help='Batch mode: JSONL file of questions answered without the interactive loop')
+    parser.add_argument('--Results', type=str, default=None, help='Batch results JSONL (default: <questions>.results.jsonl)')
+    parser.add_argument('--BatchWorkers', type=int, default=4, help='Questions sent to Ollama at the same time (batch mode)')
     args = parser.parse_args()
 
     folder_path = os.path.abspath(args.Path)
@@ -183,7 +196,7 @@ if __name__ == "__main__":
     print("Source folder =", folder_path)
     print("New model name =", NAME_NEW_MODEL)
 
-    FileTextData, FileImagesData = concat_txt_pdf_and_images_from_folder(folder_path)
+    FileTextData, FileImagesData = concat_txt_pdf_and_images_from_folder(folder_path, args.Workers or None, not args.NoCache)
     if not FileTextData and not FileImagesData:
         print("No data loaded (text or images), stopping program.")
         sys.exit(1)
@@ -203,8 +216,21 @@ if __name__ == "__main__":
     
     models = list_models()
     
-    create_model_with_text_and_images(NAME_NEW_MODEL, FileTextData, FileImagesData)
+    model_name = create_model_with_text_and_images(NAME_NEW_MODEL, FileTextData, FileImagesData)
+
+    if args.Questions:
+        images = [img_b64 for (_, img_b64) in FileImagesData]
+
+        def answer_with_images(question, record):
+            message = {"role": "user", "content": question}
+            if images:
+                message["images"] = images
+            answer, stats = OllamaBatch.chat_once(model_name, [message])
+            return answer, dict(stats, model=model_name)
+
+        OllamaBatch.run_batch(args.Questions, answer_with_images, args.Results, args.BatchWorkers)
+        sys.exit(0)
 
     print("\n--- Testing the model ---")
-    ask_question_with_images(NAME_NEW_MODEL, "Hello! Please summarize this corpus.", FileImagesData)
+    ask_question_with_images(model_name, "Hello! Please summarize this corpus.", FileImagesData)
     print("\n--- Finished ---")
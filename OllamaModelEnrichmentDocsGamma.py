@@ -6,10 +6,14 @@ import ollama
 import json
 import subprocess
 import psutil
-import requests
+import OllamaClient
+import OllamaBatch
+import OllamaModelRegistry
+import OllamaTokens
+import OllamaDocuments
+import OllamaRetrieval
 from datetime import datetime
 import PyPDF2
-import re
 import keyboard
 
 JSON_PATH = "ollama_path.json"
@@ -48,6 +52,9 @@ def is_ollama_running():
     return False
 
 def launch_ollama_if_needed():
+    if OllamaClient.is_server_ready():
+        print("Ollama is already running.")
+        return
     path = load_path_from_json()
     if path is None or not os.path.isfile(path):
         path = find_ollama_executable()
@@ -56,31 +63,36 @@ def launch_ollama_if_needed():
         else:
             print("Ollama.exe not found on the system.")
             return
+    # Not answering yet: the process scan tells a booting server from a stopped one
     if not is_ollama_running():
         subprocess.Popen([path, "serve"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         print(f"Launching Ollama from: {path}")
-    else:
-        print("Ollama is already running.")
+    if not OllamaClient.wait_until_ready():
+        print(f"Ollama server not answering at {OllamaClient.OLLAMA_BASE_URL}.")
 
 def create_model_with_text(model_name: str, long_text: str, nb_tokens):
     system_prompt = f"You are an expert on the following text. Use it to answer questions:\n{long_text}"
-    ollama.create(
-        model=model_name,
-        from_="qwen2.5-coder:7b",
-        system=system_prompt,
-        parameters={
+    # Skipped when the same corpus/parameters were already baked into a model
+    model_name = OllamaModelRegistry.create_or_reuse(
+        model_name,
+        "qwen2.5-coder:7b",
+        system_prompt,
+        {
             "temperature": 0.7,
             #"num_ctx": 4096
-            "num_ctx": nb_tokens
-        }
+            "num_ctx": OllamaTokens.num_ctx_for(nb_tokens, "qwen2.5-coder:7b")
+        },
+        # One model per file: the name follows the content instead of flipping between files
+        unique=True
     )
-    print(f"Model '{model_name}' created successfully.")
+    print(f"Model '{model_name}' ready.")
+    return model_name
 
 def ask_question(model_name: str, question: str):
     messages = [{"role": "user", "content": question}]
     try:
         print(f"Sending the question to model '{model_name}' : {question}")
-        response = ollama.chat(model=model_name, messages=messages)
+        response = OllamaClient.get_ollama_client().chat(model=model_name, messages=messages)
         print("Raw full response :", response)
         if isinstance(response, dict):
             content = response.get('message', {}).get('content')
@@ -94,42 +106,77 @@ def ask_question(model_name: str, question: str):
         print("Error while calling Ollama :", e)
 
 def count_tokens_in_txt(filepath):
-    with open(filepath, 'r', encoding='utf-8') as file:
-        text = file.read()    
-    tokens = re.findall(r"\w+|[^\w\s]", text, re.UNICODE)
-    return len(tokens)
+    return OllamaTokens.count_file_tokens(filepath)
+
+def cache_path(folder_path, use_cache):
+    return os.path.join(folder_path, OllamaDocuments.DOCUMENT_CACHE_DB) if use_cache else None
 
-def process_txt_files_from_folder(folder_path, base_model_name):
+def process_txt_files_from_folder(folder_path, base_model_name, use_cache=True, questions=None, results=None,
+                                  batch_workers=OllamaBatch.BATCH_WORKERS):
     txt_files = [f for f in os.listdir(folder_path) if f.lower().endswith('.txt')]
     if not txt_files:
         print("No .txt files found in the folder :", folder_path)
         return
 
     print("TXT files detected :", txt_files)
+    cache_db = cache_path(folder_path, use_cache)
     for file in txt_files:
         full_path = os.path.join(folder_path, file)
         try:
             print(f"File : {full_path}")
-            number_tokens = count_tokens_in_txt(full_path)
+            doc = OllamaDocuments.extract_cached(full_path, 'txt', OllamaDocuments.read_txt_pages, cache_db)
+            number_tokens = OllamaTokens.count_tokens(doc["text"], "qwen2.5-coder:7b")
             print(f"Number of tokens : {number_tokens}")
 
-            with open(full_path, 'r', encoding='utf-8') as f:
-                long_text = f.read()
+            long_text = doc["text"]
             
             #model_name = f"{base_model_name}_{os.path.splitext(file)[0]}"
             #print(f"Creating model '{model_name}' for file : {file}")
             #create_model_with_text(model_name, long_text)
             #≡create_model_with_text(base_model_name, long_text, max(nombre_tokens,4096))
-            create_model_with_text(base_model_name, long_text, number_tokens)
-            ask_question(NAME_NEW_MODEL, "Hello")
+            model_name = create_model_with_text(base_model_name, long_text, number_tokens)
+            if questions:
+                # One results file per document: the model is rebuilt for each file
+                results_path = (results or OllamaBatch.results_path_for(questions))
+                results_path = f"{os.path.splitext(results_path)[0]}.{os.path.splitext(file)[0]}.jsonl"
+                OllamaBatch.run_batch(questions, OllamaBatch.ask_model(model_name), results_path, batch_workers)
+            else:
+                ask_question(model_name, "Hello")
             #ask_question(NAME_NEW_MODEL, "Can you summarize the information that I give you ?")
         except Exception as e:
             print(f"Error reading or creating for {file} : {e}")
 
+def index_txt_files_from_folder(folder_path, base_model_name, embed_model, top_k, use_cache=True, questions=None,
+                                results=None, batch_workers=OllamaBatch.BATCH_WORKERS):
+    txt_files = [f for f in os.listdir(folder_path) if f.lower().endswith('.txt')]
+    if not txt_files:
+        print("No .txt files found in the folder :", folder_path)
+        return
+    print("TXT files detected :", txt_files)
+    cache_db = cache_path(folder_path, use_cache)
+    documents = []
+    for file in txt_files:
+        full_path = os.path.join(folder_path, file)
+        try:
+            doc = OllamaDocuments.extract_cached(full_path, 'txt', OllamaDocuments.read_txt_pages, cache_db)
+            documents.append((full_path, doc["text"]))
+        except Exception as e:
+            print(f"Error reading {file} : {e}")
+    db_path = os.path.join(folder_path, "retrieval.db")
+    OllamaRetrieval.build_index(db_path, documents, embed_model, prune=True)
+    index = OllamaRetrieval.load_index(db_path, embed_model, sources=[source for source, _ in documents])
+    print(f"Retrieval index: {len(index['rows'])} chunks, base model {base_model_name}")
+    if questions:
+        OllamaBatch.run_batch(questions, OllamaRetrieval.batch_answer_fn(base_model_name, index, top_k),
+                              results, batch_workers)
+    else:
+        OllamaRetrieval.chat_with_retrieval(base_model_name, index, top_k)
+
+
 def list_models():
     try:
         url = f"{OLLAMA_BASE_URL}/api/tags"  # Endpoint for listing models
-        response = requests.get(url)
+        response = OllamaClient.get(url)
         if response.status_code == 200:
             models = response.json().get("models", [])
             return [m["name"] for m in models]
@@ -147,7 +194,19 @@ if __name__ == "__main__":
                         help='Folder containing .pdf and .txt files to load')
     parser.add_argument('--Model', type=str, default="qwen2.5-coder:7b", help='Name of the base model')
     parser.add_argument('--NameNewModel', type=str, default="long-text-expert-file", help='Name of the new model')
+    parser.add_argument('--Mode', type=str, default="model", choices=["model", "rag"],
+                        help='model: bake the corpus into a new model, rag: retrieve relevant chunks per question')
+    parser.add_argument('--EmbedModel', type=str, default="nomic-embed-text", help='Embedding model (rag mode)')
+    parser.add_argument('--TopK', type=int, default=5, help='Number of chunks injected per question (rag mode)')
+    parser.add_argument('--TokenCounter', type=str, default="estimate", choices=["estimate", "exact"],
+                        help='estimate: fast character-based count, exact: the model tokenizer (needs `tokenizers`)')
+    parser.add_argument('--NoCache', action='store_true', help='Re-read every document, ignoring the extraction cache')
+    parser.add_argument('--Questions', type=str, default=None,
+                        help='Batch mode: JSONL file of questions answered without the interactive loop')
+    parser.add_argument('--Results', type=str, default=None, help='Batch results JSONL (default: <questions>.results.jsonl)')
+    parser.add_argument('--BatchWorkers', type=int, default=4, help='Questions sent to Ollama at the same time (batch mode)')
     args = parser.parse_args()
+    OllamaTokens.configure(args.TokenCounter)
 
     folder_path = os.path.abspath(args.Path)
     NAME_NEW_MODEL = args.NameNewModel
@@ -159,7 +218,12 @@ if __name__ == "__main__":
 
     models = list_models()
 
-    process_txt_files_from_folder(folder_path, NAME_NEW_MODEL)
+    if args.Mode == "rag":
+        index_txt_files_from_folder(folder_path, args.Model, args.EmbedModel, args.TopK, not args.NoCache,
+                                    args.Questions, args.Results, args.BatchWorkers)
+    else:
+        process_txt_files_from_folder(folder_path, NAME_NEW_MODEL, not args.NoCache,
+                                      args.Questions, args.Results, args.BatchWorkers)
     
     print("\n--- Finished ---")
 
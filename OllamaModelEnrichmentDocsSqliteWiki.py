@@ -7,16 +7,22 @@ import json
 import subprocess
 import psutil
 import requests
+import OllamaClient
+import OllamaModelRegistry
+import OllamaTokens
+import OllamaRetrieval
+import OllamaTranscript
+import OllamaBatch
+import OllamaWikiCache
+from OllamaKeywordSearch import recherche_fichiers_keywords_sqlite, mark_corpus_changed
 from datetime import datetime
 import re
 import keyboard
 import sqlite3
+import threading
 
-from langdetect import detect, DetectorFactory
-import yake
-import pke
-import spacy
-from nltk.corpus import stopwords
+from langdetect import detect, detect_langs, DetectorFactory
+from OllamaNLP import get_spacy_model, preload, NER_ONLY_DISABLE
 
 import socket
 
@@ -41,6 +47,10 @@ SPACY_MODELS = {
     'de': 'de_core_news_sm'
 }
 
+# Multilingual NER fallback when the language of the question is uncertain
+MULTILINGUAL_SPACY_MODEL = 'xx_ent_wiki_sm'
+MIN_LANG_CONFIDENCE = 0.90
+
 STOPWORDS_LANGS = {
     'fr': 'french',
     'en': 'english',
@@ -67,7 +77,7 @@ def robust_spell_correct(text):
 def parent_path(path):
     return os.path.dirname(os.path.abspath(path))
 
-def save_first_image(img_url, page_title, output_folder):
+def save_first_image(img_url, page_title, output_folder, cache_db=None, online=True):
     if not img_url:
         return None
     try:
@@ -86,10 +96,17 @@ def save_first_image(img_url, page_title, output_folder):
                 "Chrome/58.0.3029.110 Safari/537.36"
             )
         }
-        response = requests.get(img_url, timeout=10, headers=headers)
-        response.raise_for_status()
+        if cache_db:
+            data = OllamaWikiCache.image(cache_db, img_url, online)
+            if data is None:
+                print("[Warning] Offline and the image is not in the Wikipedia cache")
+                return None
+        else:
+            response = requests.get(img_url, timeout=10, headers=headers)
+            response.raise_for_status()
+            data = response.content
         with open(img_path, "wb") as img_file:
-            img_file.write(response.content)
+            img_file.write(data)
         print(f"[Info] Image saved: {img_path}")
         return img_path
     except Exception as e:
@@ -97,18 +114,22 @@ def save_first_image(img_url, page_title, output_folder):
         return None
 
 
-def main_all_information(base_path, sentences, user_input):
+def main_all_information(base_path, sentences, user_input, online=True):
     datetime_str = datetime.now().strftime("%Y%m%d_%H%M%S")
     base_path = os.path.abspath(base_path)
     output_dir = os.path.join(parent_path(base_path), "Request_Response")
     os.makedirs(output_dir, exist_ok=True)
     filename = f"wikipedia_conversation_{datetime_str}.txt"
     filepath = os.path.join(output_dir, filename)
+    # Search results, pages and images are reused between queries (and offline)
+    cache_db = os.path.join(base_path, OllamaWikiCache.WIKI_CACHE_DB)
 
     wikipedia.set_lang("en")
     print("=== Wikipedia Query ===")
     #user_input = input("👦: ").strip()
     print(f"User query: {user_input}")
+    if not online:
+        print("[Info] No internet connection: answering from the Wikipedia cache")
     
     
     corrected = robust_spell_correct(user_input)
@@ -120,7 +141,7 @@ def main_all_information(base_path, sentences, user_input):
     results = []
     results_json = {}
     try:
-        search_results = wikipedia.search(user_input)
+        search_results = OllamaWikiCache.search(cache_db, user_input, "en", online)
         print("--------------------------------------------------------------------")
         print("Search Results"+str(search_results))
         print("--------------------------------------------------------------------")
@@ -132,21 +153,21 @@ def main_all_information(base_path, sentences, user_input):
             page_title = search_results[0]  # Best match found
             print(f"Best match: {page_title}")
             try:
-                page = wikipedia.page(page_title, auto_suggest=False)
-                summary = wikipedia.summary(page_title, sentences=sentences, auto_suggest=False)
-                first_image_url = page.images[0] if page.images else ""
-                first_img_path = save_first_image(first_image_url, page_title, output_dir) if first_image_url else None
-                all_images = page.images
-                all_links = page.links
-                sections = page.sections if hasattr(page, "sections") else "Not available (use wikipediaapi for section tree)"
-                categories = page.categories if hasattr(page, "categories") else "Not available in wikipedia module"
+                page = OllamaWikiCache.page(cache_db, page_title, "en", sentences, online)
+                summary = page["summary"]
+                first_image_url = page["images"][0] if page["images"] else ""
+                first_img_path = save_first_image(first_image_url, page_title, output_dir, cache_db, online) if first_image_url else None
+                all_images = page["images"]
+                all_links = page["links"]
+                sections = page["sections"]
+                categories = page["categories"]
 
                 # Assemble results
                 results = [
                     f"Summary:\n{summary}",
-                    f"\nTitle: {page.title}",
-                    f"\nURL: {page.url}",
-                    f"\nContent:\n{page.content}",  # Full content
+                    f"\nTitle: {page['title']}",
+                    f"\nURL: {page['url']}",
+                    f"\nContent:\n{page['content']}",  # Full content
                     f"\nFirst image URL: {first_image_url or 'No image found'}",
                     f"\nFirst image saved at: {first_img_path or 'None'}",
                     f"\nAll images: {all_images if all_images else 'No images'}",
@@ -156,9 +177,9 @@ def main_all_information(base_path, sentences, user_input):
                 ]
                 results_json = {
                    "summary": summary,
-                   "title": page.title,
-                   "url": page.url,
-                   "content": page.content,
+                   "title": page["title"],
+                   "url": page["url"],
+                   "content": page["content"],
                    "first_image_url": first_image_url or None,
                    "first_image_saved_at": first_img_path or None,
                    "all_images": all_images if all_images else [],
@@ -176,9 +197,15 @@ def main_all_information(base_path, sentences, user_input):
             except wikipedia.exceptions.PageError as e:
                 results = [f"[Page error] {e}"]
                 results_json = {"error": str(e)}
+            except LookupError:
+                # Offline cache miss: reported by the outer handler
+                raise
             except Exception as e:
                 results = [f"[Unknown error] {str(e)}"]
                 results_json = {"error": str(e)}
+    except LookupError as e:
+        results = [f"[Offline] {e}"]
+        results_json = {"error": str(e)}
     except Exception as e:
         results = [f"[Unknown error] {str(e)}"]
 
@@ -224,15 +251,26 @@ def detect_language(text):
     except Exception:
         return None
 
+def detect_language_confidence(text):
+    try:
+        best = detect_langs(text)[0]
+        return best.lang, best.prob
+    except Exception:
+        return None, 0.0
+
 def extract_yake(text, language):
+    import yake
     extractor = yake.KeywordExtractor(lan=language, n=3, top=10)
     keywords = extractor.extract_keywords(text)
     return [kw for kw, score in keywords]
 
 def extract_pke(text, language):
+    # pke/nltk are only imported when keyphrase extraction is actually used
+    import pke
+    from nltk.corpus import stopwords
     if language not in SPACY_MODELS:
         raise ValueError(f"Language not supported: {language}")
-    nlp = spacy.load(SPACY_MODELS[language])
+    nlp = get_spacy_model(SPACY_MODELS[language])
     extractor = pke.unsupervised.MultipartiteRank()
     extractor.load_document(input=text, language=language, spacy_model=nlp)
     stoplist_lang = STOPWORDS_LANGS.get(language, 'english')
@@ -254,7 +292,7 @@ def extract_person_names(text):
     language = detect_language(text)
     if language not in SPACY_MODELS:
         raise ValueError(f"Language '{language}' not supported")
-    nlp = spacy.load(SPACY_MODELS[language])
+    nlp = get_spacy_model(SPACY_MODELS[language])
     doc = nlp(text)
     labels = ["PER", "PERSON"]
     names = [ent.text for ent in doc.ents if ent.label_ in labels]
@@ -266,7 +304,7 @@ def extract_person_names2(text):
     for language in SUPPORTED_LANGS:
         #if is_person_query(text, language):
             #print("QUERY")
-            nlp = spacy.load(SPACY_MODELS[language])
+            nlp = get_spacy_model(SPACY_MODELS[language])
             doc = nlp(text)
             labels = ["PER", "PERSON"]
             names_sub = [ent.text for ent in doc.ents if ent.label_ in labels]
@@ -274,6 +312,22 @@ def extract_person_names2(text):
                  names = names_sub
     return names
 
+def extract_person_names_routed(text):
+    # Run only the pipeline of the detected language (NER components only);
+    # fall back to the multilingual model, then to all pipelines, when unsure.
+    labels = ["PER", "PERSON"]
+    language, confidence = detect_language_confidence(text)
+    if language in SPACY_MODELS and confidence >= MIN_LANG_CONFIDENCE:
+        nlp = get_spacy_model(SPACY_MODELS[language], NER_ONLY_DISABLE)
+    else:
+        print(f"Language uncertain ({language}, {confidence:.2f}), using multilingual NER.")
+        try:
+            nlp = get_spacy_model(MULTILINGUAL_SPACY_MODEL, NER_ONLY_DISABLE)
+        except OSError:
+            return extract_person_names2(text)
+    doc = nlp(text)
+    return [ent.text for ent in doc.ents if ent.label_ in labels]
+
 QUESTION_PATTERNS = {
     'fr': ['donne moi des informations concernant', 'qui est', 'informations sur', 'parle moi de', 'qui sont'],
     'en': ['give information about', 'who is', 'tell me about', 'information on', 'who are'],
@@ -297,7 +351,7 @@ def extract_person_keyword(text):
         return []
     if not is_person_query(text, language):
         return []
-    nlp = spacy.load(SPACY_MODELS[language])
+    nlp = get_spacy_model(SPACY_MODELS[language])
     doc = nlp(text)
     labels = ["PERSON", "PER"]
     person_names = [ent.text for ent in doc.ents if ent.label_ in labels]
@@ -306,60 +360,6 @@ def extract_person_keyword(text):
 
 
 
-# ---- Gestion SQLite pour keywords ---------------------
-def init_db(db_path):
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS recherches (
-            keywords TEXT PRIMARY KEY,
-            result TEXT
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-def query_db(db_path, keywords):
-    key = "_".join(sorted(set(keywords))).lower()
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-    c.execute('SELECT result FROM recherches WHERE keywords=?', (key,))
-    row = c.fetchone()
-    conn.close()
-    if row:
-        return json.loads(row[0])
-    return None
-
-def insert_db(db_path, keywords, results):
-    key = "_".join(sorted(set(keywords))).lower()
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-    c.execute('INSERT OR REPLACE INTO recherches (keywords, result) VALUES (?, ?)', (key, json.dumps(results)))
-    conn.commit()
-    conn.close()
-
-def recherche_fichiers_keywords_sqlite(path, keywords, db_path="resultats.db"):
-    db_path = path+"/"+db_path
-    init_db(db_path)
-    result = query_db(db_path, keywords)
-    if result is not None:
-        print("Query found in SQLite database.")
-        return result
-    print("Searching .txt files in folder...")
-    result_paths = []
-    for root, _, files in os.walk(path):
-        for file in files:
-            if file.endswith('.txt'):
-                chemin = os.path.join(root, file)
-                try:
-                    with open(chemin, "r", encoding="utf-8") as f:
-                        contenu = f.read().lower()
-                    if all(k.lower() in contenu for k in keywords):
-                        result_paths.append(chemin)
-                except Exception as e:
-                    print(f"Error path {chemin}: {e}")
-    insert_db(db_path, keywords, result_paths)
-    return result_paths
 
 # ---- Logique Ollama ----------------------------------
 JSON_PATH = "ollama_path.json"
@@ -398,6 +398,9 @@ def is_ollama_running():
     return False
 
 def launch_ollama_if_needed():
+    if OllamaClient.is_server_ready():
+        print("Ollama is already running.")
+        return
     path = load_path_from_json()
     if path is None or not os.path.isfile(path):
         path = find_ollama_executable()
@@ -406,15 +409,15 @@ def launch_ollama_if_needed():
         else:
             print("Ollama.exe not found on the system.")
             return
+    # Not answering yet: the process scan tells a booting server from a stopped one
     if not is_ollama_running():
         subprocess.Popen([path, "serve"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         print(f"Launching Ollama from: {path}")
-    else:
-        print("Ollama is already running.")
+    if not OllamaClient.wait_until_ready():
+        print(f"Ollama server not answering at {OllamaClient.OLLAMA_BASE_URL}.")
 
 def create_model_with_text(model_name: str, long_text: str, nb_tokens):
-    min_tokens = 4096
-    ctx_tokens = max(nb_tokens, min_tokens)
+    ctx_tokens = OllamaTokens.num_ctx_for(nb_tokens, "qwen2.5-coder:7b")
     system_prompt = (
         "You are an expert assistant. "
         "Respond ONLY using the following text as your knowledge source. "
@@ -422,39 +425,33 @@ def create_model_with_text(model_name: str, long_text: str, nb_tokens):
         "Strictly base all answers on this text:\n"
         f"{long_text}"
     )
-    ollama.create(
-        model=model_name,
-        from_="qwen2.5-coder:7b",
-        system=system_prompt,
-        parameters={
+    # Skipped when the same corpus/parameters were already baked into a model
+    model_name = OllamaModelRegistry.create_or_reuse(
+        model_name,
+        "qwen2.5-coder:7b",
+        system_prompt,
+        {
             "temperature": 0.7,
             "num_ctx": ctx_tokens
-        }
+        },
+        unique=True
     )
-    print(f"Model '{model_name}' created successfully (num_ctx={ctx_tokens}).")
+    print(f"Model '{model_name}' ready (num_ctx={ctx_tokens}).")
+    return model_name
 
 def count_tokens_in_txt(filepath):
-    with open(filepath, 'r', encoding='utf-8') as file:
-        text = file.read()
-    tokens = re.findall(r"\w+|[^\w\s]", text, re.UNICODE)
-    return len(tokens)
+    return OllamaTokens.count_file_tokens(filepath)
 
 def extraire_keywords(phrase):
     return re.findall(r'\[(.*?)\]', phrase)
 
 def save_interaction_json(path, interaction,datetime_str):
-    filename = f"ollama_conversation_{datetime_str}.json"
+    # Append-only JSONL (one interaction per line); convert with OllamaTranscript.jsonl_to_json
+    filename = f"ollama_conversation_{datetime_str}.jsonl"
     #filepath = os.path.join(path, "questions_reponses.json")
     filepath = os.path.join(path,filename)
     try:
-        if os.path.exists(filepath):
-            with open(filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-        else:
-            data = []
-        data.append(interaction)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        OllamaTranscript.append_interaction(filepath, interaction)
     except Exception as e:
         print(f"JSON writing error: {e}")
 
@@ -476,7 +473,7 @@ def ask_and_save(model_name, path):
         date_question = datetime.now().isoformat()
         try:
             messages = [{"role": "user", "content": question}]
-            response = ollama.chat(model=model_name, messages=messages)
+            response = OllamaClient.get_ollama_client().chat(model=model_name, messages=messages)
             if hasattr(response, 'message'):
                 content = getattr(response.message, 'content', None)
             elif isinstance(response, dict):
@@ -500,7 +497,81 @@ def ask_and_save(model_name, path):
             print("Error calling Ollama :", e)
 
 
-def ask_and_save_beta(model_name, path, question):
+def ask_model(model_name, question, index=None, top_k=5):
+    # One question, no history; returns the answer text or None
+    if index is not None:
+        # Only the chunks most similar to the question go into the prompt
+        messages = OllamaRetrieval.retrieval_messages(index, question, top_k)
+    else:
+        messages = [{"role": "user", "content": question}]
+    response = OllamaClient.get_ollama_client().chat(model=model_name, messages=messages)
+    if hasattr(response, 'message'):
+        return getattr(response.message, 'content', None)
+    if isinstance(response, dict):
+        return response.get('message', {}).get('content')
+    return None
+
+def find_files(folder_path, keywords, sentences=1000):
+    # Keyword search in the corpus; on a miss, fetch Wikipedia pages (or the cached ones) and search again
+    resultats = []
+    if keywords:
+        resultats = recherche_fichiers_keywords_sqlite(folder_path, keywords)
+    if keywords and not resultats:
+        # Offline, pages already in the Wikipedia cache can still be used
+        online = internet_connection_2()
+        cache_db = os.path.join(folder_path, OllamaWikiCache.WIKI_CACHE_DB)
+        if not online and not OllamaWikiCache.has_search(cache_db, keywords[0]):
+            return resultats
+        main_all_information(folder_path, sentences, keywords[0], online)
+        # New files were written: rescan the corpus instead of returning the cached miss
+        mark_corpus_changed(folder_path)
+        resultats = recherche_fichiers_keywords_sqlite(folder_path, keywords)
+    return resultats
+
+def build_file_index(folder_path, files, embed_model):
+    documents = []
+    for filepath in files:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            documents.append((filepath, f.read()))
+    db_path = os.path.join(folder_path, "retrieval.db")
+    OllamaRetrieval.build_index(db_path, documents, embed_model)
+    return OllamaRetrieval.load_index(db_path, embed_model, sources=files)
+
+def model_for_file(name_new_model, filepath):
+    nombre_tokens = count_tokens_in_txt(filepath)
+    with open(filepath, 'r', encoding='utf-8') as f:
+        long_text = f.read()
+    # One derived model per file content, reused by later queries
+    return create_model_with_text(name_new_model, long_text, nombre_tokens)
+
+def batch_answer_fn(folder_path, base_model, name_new_model, ner="all", mode="model", embed_model="nomic-embed-text",
+                    top_k=5, sentences=1000):
+    # answer_fn for OllamaBatch.run_batch: keywords, file search, then the model(s)
+    # spaCy pipelines, Wikipedia downloads and the corpus/index writes are not shared between threads
+    lock = threading.Lock()
+
+    def answer_fn(question, record):
+        with lock:
+            keywords = extract_person_names_routed(question) if ner == "routed" else extract_person_names2(question)
+            files = find_files(folder_path, keywords, sentences)
+        if not files:
+            raise LookupError(f"No file contains all keywords {keywords}")
+        answers = []
+        if mode == "rag":
+            with lock:
+                index = build_file_index(folder_path, files, embed_model)
+            answers.append((base_model, ask_model(base_model, question, index, top_k)))
+        else:
+            for filepath in files:
+                with lock:
+                    model_name = model_for_file(name_new_model, filepath)
+                answers.append((model_name, ask_model(model_name, question)))
+        answer = "\n\n".join(content for _, content in answers if content) or None
+        return answer, {"keywords": keywords, "files": files, "models": [m for m, _ in answers]}
+    return answer_fn
+
+
+def ask_and_save_beta(model_name, path, question, index=None, top_k=5):
     datetime_str = datetime.now().strftime("%Y%m%d_%H%M%S")
     up_path = parent_path(path)
     up_path_output = up_path+"/Request_Response"
@@ -523,14 +594,7 @@ def ask_and_save_beta(model_name, path, question):
 
         date_question = datetime.now().isoformat()
         try:
-            messages = [{"role": "user", "content": question}]
-            response = ollama.chat(model=model_name, messages=messages)
-            if hasattr(response, 'message'):
-                content = getattr(response.message, 'content', None)
-            elif isinstance(response, dict):
-                content = response.get('message', {}).get('content')
-            else:
-                content = None
+            content = ask_model(model_name, question, index, top_k)
             if content:
                 print("\n🤖:", content)
                 date_reponse = datetime.now().isoformat()
@@ -557,20 +621,53 @@ if __name__ == "__main__":
     parser.add_argument('--Path', type=str, default='.', help='Path')
     parser.add_argument('--Model', type=str, default="qwen2.5-coder:7b", help='Model')
     parser.add_argument('--NameNewModel', type=str, default="long-text-expert-file", help='Name New Model')
+    parser.add_argument('--NER', type=str, default="all", choices=["all", "routed"],
+                        help='all: run every language pipeline, routed: only the detected language')
+    parser.add_argument('--PreloadNLP', type=int, default=0, help='Load the spaCy models at startup (1=yes, 0=no)')
+    parser.add_argument('--Mode', type=str, default="model", choices=["model", "rag"],
+                        help='model: bake each found file into a new model, rag: retrieve relevant chunks per question')
+    parser.add_argument('--EmbedModel', type=str, default="nomic-embed-text", help='Embedding model (rag mode)')
+    parser.add_argument('--TopK', type=int, default=5, help='Number of chunks injected per question (rag mode)')
+    parser.add_argument('--TokenCounter', type=str, default="estimate", choices=["estimate", "exact"],
+                        help='estimate: fast character-based count, exact: the model tokenizer (needs `tokenizers`)')
+    parser.add_argument('--Questions', type=str, default=None,
+                        help='Batch mode: JSONL file of questions answered without the interactive loop')
+    parser.add_argument('--Results', type=str, default=None, help='Batch results JSONL (default: <questions>.results.jsonl)')
+    parser.add_argument('--BatchWorkers', type=int, default=4, help='Questions sent to Ollama at the same time (batch mode)')
+    parser.add_argument('--TranscriptFlush', type=int, default=1, help='Interactions buffered before the transcript is flushed')
+    parser.add_argument('--TranscriptFsync', type=int, default=0, help='fsync the transcript after each flush (1=yes, 0=no)')
     
     sentences=1000
     
     args = parser.parse_args()
+    OllamaTokens.configure(args.TokenCounter)
+    OllamaTranscript.configure(args.TranscriptFlush, args.TranscriptFsync)
 
     folder_path = os.path.abspath(args.Path)
     
+    if args.PreloadNLP:
+        if args.NER == "routed":
+            preload([SPACY_MODELS[lang] for lang in SUPPORTED_LANGS] + [MULTILINGUAL_SPACY_MODEL], NER_ONLY_DISABLE)
+        else:
+            preload([SPACY_MODELS[lang] for lang in SUPPORTED_LANGS])
+    
+    if args.Questions:
+        launch_ollama_if_needed()
+        answer_fn = batch_answer_fn(folder_path, args.Model, args.NameNewModel, args.NER, args.Mode,
+                                    args.EmbedModel, args.TopK, sentences)
+        OllamaBatch.run_batch(args.Questions, answer_fn, args.Results, args.BatchWorkers)
+        sys.exit(0)
+
     question = input("👦: ")
     
     #keywords = extraire_keywords(question)
     
     
     #keywords = extract_person_keyword(question)
-    keywords = extract_person_names2(question)
+    if args.NER == "routed":
+        keywords = extract_person_names_routed(question)
+    else:
+        keywords = extract_person_names2(question)
     
     size_keywords_list = len(keywords)
         
@@ -585,24 +682,16 @@ if __name__ == "__main__":
 
     print("Size Keywords ="+str(size_keywords_list))
     
-    resultats = []
-    if size_keywords_list>0:
-        resultats = recherche_fichiers_keywords_sqlite(folder_path, keywords)
-        
-    if (not resultats and internet_connection_2()):
-        main_all_information(folder_path, sentences, keywords[0])
-        if size_keywords_list>0:
-            resultats = recherche_fichiers_keywords_sqlite(folder_path, keywords)
-        
+    resultats = find_files(folder_path, keywords, sentences)
     
-    if resultats:
+    if resultats and args.Mode == "rag":
+        print("Files found :", resultats)
+        index = build_file_index(folder_path, resultats, args.EmbedModel)
+        ask_and_save_beta(args.Model, folder_path, question, index, args.TopK)
+    elif resultats:
         print("Files found :", resultats)
-        for i, filepath in enumerate(resultats):
-            nombre_tokens = count_tokens_in_txt(filepath)
-            with open(filepath, 'r', encoding='utf-8') as f:
-                long_text = f.read()
-            model_name = f"{NAME_NEW_MODEL}_{i+1}"
-            create_model_with_text(model_name, long_text, nombre_tokens)
+        for filepath in resultats:
+            model_name = model_for_file(NAME_NEW_MODEL, filepath)
             #ask_and_save(model_name, folder_path)
             ask_and_save_beta(model_name, folder_path, question)
     else:
@@ -0,0 +1,173 @@
+# Author(s): Dr. Patrick Lemoine
+# Registry of the models derived by the enrichment scripts (ollama.create with
+# a corpus baked into the system prompt). Each derived model is recorded with
+# a fingerprint of (base model, system prompt, parameters); when the same
+# fingerprint is requested again and the model still exists on the server,
+# the create step is skipped. Derived models unused for MAX_AGE, or beyond
+# MAX_DERIVED_MODELS, are deleted from the server (only registered models).
+
+import json
+import time
+import hashlib
+import sqlite3
+import OllamaClient
+
+
+REGISTRY_DB = "model_registry.db"
+MAX_DERIVED_MODELS = 20         # least recently used derived models beyond this are deleted
+MAX_AGE = 30 * 24 * 3600        # seconds without use before a derived model is deleted
+
+
+def init_registry(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS derived_models (
+            name TEXT PRIMARY KEY,
+            fingerprint TEXT,
+            base_model TEXT,
+            parameters TEXT,
+            created REAL,
+            last_used REAL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS derived_models_fingerprint ON derived_models(fingerprint)')
+    conn.commit()
+    conn.close()
+
+
+def fingerprint(base_model, system, parameters):
+    h = hashlib.sha256()
+    h.update(json.dumps({"from": base_model, "parameters": parameters}, sort_keys=True).encode("utf-8"))
+    h.update(b"\0")
+    h.update(system.encode("utf-8"))
+    return h.hexdigest()
+
+
+def derived_name(prefix, digest):
+    return f"{prefix}_{digest[:12]}"
+
+
+def _normalize(name):
+    return name if ":" in name else name + ":latest"
+
+
+def server_models():
+    # Names of the models present on the server, or None if it cannot be reached
+    try:
+        response = OllamaClient.get(OllamaClient.api_url("/api/tags"))
+        response.raise_for_status()
+        return {_normalize(m["name"]) for m in response.json().get("models", [])}
+    except Exception as e:
+        print(f"Cannot list the server models: {e}")
+        return None
+
+
+def lookup(db_path, digest, name=None):
+    # Registered model with this fingerprint (and this name if given) still on the server
+    conn = sqlite3.connect(db_path)
+    if name is None:
+        rows = conn.execute('SELECT name FROM derived_models WHERE fingerprint=? ORDER BY last_used DESC',
+                            (digest,)).fetchall()
+    else:
+        rows = conn.execute('SELECT name FROM derived_models WHERE fingerprint=? AND name=?',
+                            (digest, name)).fetchall()
+    conn.close()
+    if not rows:
+        return None
+    available = server_models()
+    for (candidate,) in rows:
+        if available is not None and _normalize(candidate) in available:
+            return candidate
+    return None
+
+
+def register(db_path, name, digest, base_model, parameters):
+    now = time.time()
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+        INSERT OR REPLACE INTO derived_models (name, fingerprint, base_model, parameters, created, last_used)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (name, digest, base_model, json.dumps(parameters, sort_keys=True), now, now))
+    conn.commit()
+    conn.close()
+
+
+def touch(db_path, name):
+    conn = sqlite3.connect(db_path)
+    conn.execute('UPDATE derived_models SET last_used=? WHERE name=?', (time.time(), name))
+    conn.commit()
+    conn.close()
+
+
+def create_or_reuse(model_name, base_model, system, parameters, db_path=REGISTRY_DB, unique=False, force=False):
+    # Create `model_name` from `base_model` unless an identical one is registered.
+    # unique=True derives the name from the fingerprint (one model per corpus).
+    # Returns the name of the model to query.
+    init_registry(db_path)
+    digest = fingerprint(base_model, system, parameters)
+    name = derived_name(model_name, digest) if unique else model_name
+    if not force:
+        existing = lookup(db_path, digest, name)
+        if existing:
+            touch(db_path, existing)
+            print(f"Model '{existing}' already built from this corpus, reusing it.")
+            return existing
+    OllamaClient.get_ollama_client().create(
+        model=name,
+        from_=base_model,
+        system=system,
+        parameters=parameters
+    )
+    register(db_path, name, digest, base_model, parameters)
+    gc_models(db_path, keep=name)
+    return name
+
+
+def gc_models(db_path=REGISTRY_DB, max_models=MAX_DERIVED_MODELS, max_age=MAX_AGE, keep=None):
+    # Delete stale registered models from the server and forget models removed by hand
+    init_registry(db_path)
+    available = server_models()
+    if available is None:
+        return []
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute('SELECT name, last_used FROM derived_models ORDER BY last_used DESC').fetchall()
+    now = time.time()
+    removed = []
+    kept = 0
+    for name, last_used in rows:
+        if _normalize(name) not in available:
+            conn.execute('DELETE FROM derived_models WHERE name=?', (name,))
+            continue
+        if name == keep or (kept < max_models and now - last_used < max_age):
+            kept += 1
+            continue
+        try:
+            OllamaClient.get_ollama_client().delete(name)
+            conn.execute('DELETE FROM derived_models WHERE name=?', (name,))
+            removed.append(name)
+        except Exception as e:
+            print(f"Cannot delete stale model '{name}': {e}")
+    conn.commit()
+    conn.close()
+    if removed:
+        print(f"Stale derived model(s) deleted: {removed}")
+    return removed
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="List or garbage-collect the derived enrichment models.")
+    parser.add_argument('--Registry', type=str, default=REGISTRY_DB, help='Registry database')
+    parser.add_argument('--GC', action='store_true', help='Delete stale derived models')
+    parser.add_argument('--MaxModels', type=int, default=MAX_DERIVED_MODELS, help='Derived models kept (GC)')
+    parser.add_argument('--MaxAgeDays', type=float, default=MAX_AGE / 86400, help='Days without use before deletion (GC)')
+    args = parser.parse_args()
+
+    init_registry(args.Registry)
+    if args.GC:
+        gc_models(args.Registry, args.MaxModels, args.MaxAgeDays * 86400)
+    conn = sqlite3.connect(args.Registry)
+    for name, base_model, last_used in conn.execute(
+            'SELECT name, base_model, last_used FROM derived_models ORDER BY last_used DESC'):
+        print(f"{name:40s} {base_model:25s} last used {time.strftime('%Y-%m-%d %H:%M', time.localtime(last_used))}")
+    conn.close()
@@ -1,42 +1,156 @@
 # Author(s): Dr. Patrick Lemoine
+# Updates the local Ollama models through the HTTP API: the model list comes
+# from /api/tags, each model's local digest is compared with the registry
+# manifest (no download when they match), and the others are pulled through
+# /api/pull, a few at a time, with streamed progress and a final report.
+
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import OllamaClient
+import OllamaStream
+
+
+OLLAMA_BASE_URL = "http://localhost:11434"
+REGISTRY_URL = "https://registry.ollama.ai"
+MANIFEST_ACCEPT = "application/vnd.docker.distribution.manifest.v2+json"
+PULL_WORKERS = 2            # simultaneous downloads (shares the bandwidth)
+PROGRESS_EVERY = 5          # seconds between two progress lines of a model
+
+_print_lock = threading.Lock()
+
+
+def log(message):
+    with _print_lock:
+        print(message, flush=True)
 
-import subprocess
 
 def get_models():
+    # [(name, digest)] of the local models
     try:
-        result = subprocess.run(
-            ["ollama", "list"],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        lines = result.stdout.strip().split("\n")
-        models = [line.split()[0] for line in lines if line.strip()]
-        return models
-    except FileNotFoundError:
-        print("Error: the 'ollama' command is not installed or could not be found.")
-        return []
-    except subprocess.CalledProcessError as e:
+        response = OllamaClient.get(OllamaClient.api_url("/api/tags", OLLAMA_BASE_URL))
+        response.raise_for_status()
+        return [(m["name"], m.get("digest", "")) for m in response.json().get("models", [])]
+    except Exception as e:
         print(f"Error while retrieving the list of models : {e}")
         return []
 
-def update_model(model):
+
+def manifest_url(model):
+    name, _, tag = model.partition(":")
+    tag = tag or "latest"
+    parts = name.split("/")
+    if len(parts) == 1:
+        parts = ["library"] + parts
+    if len(parts) != 2:
+        # Other registries (hf.co/..., private hosts): not checked
+        return None
+    return f"{REGISTRY_URL}/v2/{parts[0]}/{parts[1]}/manifests/{tag}"
+
+
+def remote_digest(model):
+    # sha256 of the registry manifest (what /api/tags reports as the local digest),
+    # None if the model is not on the registry (e.g. a model created locally)
+    url = manifest_url(model)
+    if url is None:
+        return None
+    response = OllamaClient.get(url, headers={"Accept": MANIFEST_ACCEPT})
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return hashlib.sha256(response.content).hexdigest()
+
+
+def pull_model(model):
+    # Streams /api/pull; returns the number of bytes actually downloaded
+    layers = {}
+    last_report = 0
+    for chunk in OllamaStream.iter_ndjson(OllamaClient.api_url("/api/pull", OLLAMA_BASE_URL), {"model": model}):
+        digest = chunk.get("digest")
+        if digest and "total" in chunk:
+            completed = chunk.get("completed", 0)
+            start, _, total = layers.get(digest, (completed, 0, chunk["total"]))
+            layers[digest] = (start, completed, total)
+            now = time.time()
+            if now - last_report >= PROGRESS_EVERY:
+                last_report = now
+                done = sum(c for _, c, _ in layers.values())
+                size = sum(t for _, _, t in layers.values())
+                log(f"[{model}] {chunk.get('status', '')}: {done / 1e6:.0f}/{size / 1e6:.0f} MB "
+                    f"({100 * done / max(size, 1):.0f}%)")
+        elif chunk.get("status"):
+            log(f"[{model}] {chunk['status']}")
+    return sum(max(0, c - s) for s, c, _ in layers.values())
+
+
+def update_model(model, local_digest, force=False):
+    # Returns a report entry: status ('up-to-date', 'updated', 'local', 'failed'), bytes, seconds
+    start = time.time()
+    entry = {"model": model, "status": "updated", "bytes": 0, "seconds": 0.0, "error": None}
     try:
-        subprocess.run(
-            ["ollama", "pull", model],
-            check=True
-        )
-        print(f"Model '{model}' updated successfully.")
-    except subprocess.CalledProcessError:
-        print(f"Failed to update the model '{model}'.")
-
-def main():
+        if not force:
+            digest = remote_digest(model)
+            if digest is None:
+                entry["status"] = "local"
+                log(f"Model '{model}' is not on the registry, skipped.")
+                return entry
+            if digest == local_digest:
+                entry["status"] = "up-to-date"
+                log(f"Model '{model}' is up to date.")
+                return entry
+        entry["bytes"] = pull_model(model)
+        log(f"Model '{model}' updated successfully.")
+    except Exception as e:
+        entry["status"] = "failed"
+        entry["error"] = str(e)
+        log(f"Failed to update the model '{model}': {e}")
+    finally:
+        entry["seconds"] = time.time() - start
+    return entry
+
+
+def print_report(entries, elapsed):
+    print("\n--- Update report ---")
+    for entry in entries:
+        line = f"{entry['model']:40s} {entry['status']:10s} {entry['bytes'] / 1e6:10.1f} MB {entry['seconds']:8.1f}s"
+        if entry["error"]:
+            line += f"  {entry['error']}"
+        print(line)
+    total = sum(e["bytes"] for e in entries)
+    counts = {}
+    for e in entries:
+        counts[e["status"]] = counts.get(e["status"], 0) + 1
+    print(f"{len(entries)} model(s): {counts}, {total / 1e6:.1f} MB downloaded in {elapsed:.1f}s")
+
+
+def main(workers=PULL_WORKERS, only=None, force=False):
     models = get_models()
+    if only:
+        models = [(name, digest) for name, digest in models if name in only or name.split(":")[0] in only]
     if not models:
         print("No models to update.")
-        return
-    for model in models:
-        update_model(model)
+        return []
+    start = time.time()
+    entries = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(update_model, name, digest, force) for name, digest in models]
+        for future in as_completed(futures):
+            entries.append(future.result())
+    entries.sort(key=lambda e: e["model"])
+    print_report(entries, time.time() - start)
+    return entries
+
 
 if __name__ == "__main__":
-    main()
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--URL', type=str, default="http://localhost:11434", help='Ollama server URL')
+    parser.add_argument('--Workers', type=int, default=PULL_WORKERS, help='Models downloaded simultaneously')
+    parser.add_argument('--Models', type=str, default="", help='Comma-separated models to update (default: all)')
+    parser.add_argument('--Force', action='store_true', help='Pull even when the local digest matches the registry')
+    args = parser.parse_args()
+
+    OLLAMA_BASE_URL = args.URL
+    OllamaClient.configure(base_url=OLLAMA_BASE_URL)
+    main(args.Workers, [m.strip() for m in args.Models.split(",") if m.strip()], args.Force)
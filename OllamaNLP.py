@@ -0,0 +1,50 @@
+# Author(s): Dr. Patrick Lemoine
+# Process-wide spaCy model registry: each pipeline is loaded once on first use
+# and shared by all the NER / keyword functions. At most MAX_MODELS pipelines
+# stay in memory (least recently used one evicted first).
+# Components listed in `disable` (when present in the pipeline) are turned
+# off, e.g. NER_ONLY_DISABLE for NER-only use.
+
+import threading
+from collections import OrderedDict
+import spacy
+
+
+MAX_MODELS = 5
+
+# Components not needed when only named entities are wanted
+NER_ONLY_DISABLE = ("parser", "lemmatizer", "tagger", "morphologizer", "attribute_ruler", "senter")
+
+_models = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_spacy_model(name, disable=()):
+    key = (name, tuple(sorted(disable)))
+    with _lock:
+        nlp = _models.get(key)
+        if nlp is not None:
+            _models.move_to_end(key)
+            return nlp
+        nlp = spacy.load(name)
+        for component in disable:
+            if component in nlp.pipe_names:
+                nlp.disable_pipe(component)
+        _models[key] = nlp
+        while len(_models) > MAX_MODELS:
+            _models.popitem(last=False)
+    return nlp
+
+
+def preload(names, disable=()):
+    for name in names:
+        try:
+            get_spacy_model(name, disable)
+            print(f"spaCy model loaded: {name}")
+        except OSError as e:
+            print(f"spaCy model {name} not available: {e}")
+
+
+def clear():
+    with _lock:
+        _models.clear()
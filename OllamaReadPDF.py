@@ -6,8 +6,15 @@ import ollama
 import json
 import subprocess
 import psutil
-import requests
+import OllamaClient
+import OllamaImages
+import OllamaChat
+import OllamaTranscript
+import OllamaDocuments
+import OllamaTokens
 from datetime import datetime
+import re
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import fitz  
 from PIL import Image
 import base64
@@ -16,6 +23,19 @@ OLLAMA_BASE_URL = "http://localhost:11434"
 MODEL_NAME = "llava" 
 JSON_PATH = "ollama_path.json"
 
+# Map-reduce mode
+IMAGE_TOKENS = 600          # rough prompt cost of one image
+MAP_PROMPT = (
+    "Here are pages {first}-{last} of a larger document. "
+    "Task: {question}\n"
+    "Answer for these pages only, keeping every fact that may matter for the whole document.\n\n"
+)
+REDUCE_PROMPT = (
+    "Here are partial answers, each computed on a consecutive part of one document. "
+    "Task: {question}\n"
+    "Merge them into a single coherent answer for the whole document, without repetition.\n\n"
+)
+
 
 
 def save_path_to_json(path):
@@ -56,6 +76,9 @@ def is_ollama_running():
     return False
 
 def launch_ollama_if_needed():
+    if OllamaClient.is_server_ready():
+        print("Ollama is already running.")
+        return
     path = load_path_from_json()
     if path is None or not os.path.isfile(path):
         path = find_ollama_executable()
@@ -64,38 +87,46 @@ def launch_ollama_if_needed():
         else:
             print("Ollama.exe not found on the system.")
             return
+    # Not answering yet: the process scan tells a booting server from a stopped one
     if not is_ollama_running():
         # Start Ollama server (add 'serve' argument if necessary)
         subprocess.Popen([path, "serve"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         print(f"Launching Ollama from: {path}")
-    else:
-        print("Ollama is already running.")
+    if not OllamaClient.wait_until_ready():
+        print(f"Ollama server not answering at {OllamaClient.OLLAMA_BASE_URL}.")
 
 
 
-def extract_text_from_pdf(pdf_path):
+def extract_pages_from_pdf(pdf_path):
     doc = fitz.open(pdf_path)
-    full_text = ""
-    for page in doc:
-        full_text += page.get_text()
-    return full_text
+    try:
+        return [page.get_text() for page in doc]
+    finally:
+        doc.close()
 
-def extract_images_from_pdf(pdf_path):
+def extract_text_from_pdf(pdf_path, cache_db=None):
+    # Page texts are kept in the extraction cache (see OllamaDocuments)
+    entry = OllamaDocuments.extract_cached(pdf_path, 'fitz', extract_pages_from_pdf, cache_db, MODEL_NAME)
+    return "".join(OllamaDocuments.split_pages(entry["text"], entry["pages"]))
+
+def extract_images_from_pdf(pdf_path, max_side=OllamaImages.DEFAULT_MAX_SIDE):
     doc = fitz.open(pdf_path)
-    images_base64 = []
+    images_bytes = []
+    seen_xrefs = set()
     for page_num in range(len(doc)):
         page = doc[page_num]
         image_list = page.get_images(full=True)
         for img_index, img in enumerate(image_list):
             xref = img[0]
+            if xref in seen_xrefs:
+                # Same embedded image reused on several pages
+                continue
+            seen_xrefs.add(xref)
             base_image = doc.extract_image(xref)
-            image_bytes = base_image["image"]
-            image_ext = base_image["ext"]
+            images_bytes.append(base_image["image"])
 
-            # Convertir en base64
-            b64_str = base64.b64encode(image_bytes).decode()
-            images_base64.append(b64_str)
-    return images_base64
+    # Downscale, re-encode as JPEG, drop duplicates, then convert to base64
+    return OllamaImages.encode_images_dedup(images_bytes, max_side)
 
 def ask_ollama_with_text_and_images(text, images_base64, base_url, model_name):
     url = f"{base_url}/api/chat"
@@ -113,7 +144,7 @@ def ask_ollama_with_text_and_images(text, images_base64, base_url, model_name):
         "stream": False
     }
     
-    response = requests.post(url, json=data)
+    response = OllamaClient.post(url, json=data)
     if response.status_code == 200:
         content = response.json()
         if "choices" in content and len(content["choices"]) > 0:
@@ -125,6 +156,150 @@ def ask_ollama_with_text_and_images(text, images_base64, base_url, model_name):
 
 
 
+def iter_pdf_pages(pdf_path, with_images=True, cache_db=None):
+    # Yield (page number, text, [image bytes]) one page at a time
+    if cache_db and not with_images:
+        # Text only: served from the extraction cache, the PDF is not parsed again
+        entry = OllamaDocuments.extract_cached(pdf_path, 'fitz', extract_pages_from_pdf, cache_db, MODEL_NAME)
+        for page_num, text in enumerate(OllamaDocuments.split_pages(entry["text"], entry["pages"])):
+            yield page_num + 1, text, []
+        return
+    doc = fitz.open(pdf_path)
+    seen_xrefs = set()
+    try:
+        for page_num in range(len(doc)):
+            page = doc[page_num]
+            images = []
+            if with_images:
+                for img in page.get_images(full=True):
+                    xref = img[0]
+                    if xref in seen_xrefs:
+                        continue
+                    seen_xrefs.add(xref)
+                    images.append(doc.extract_image(xref)["image"])
+            yield page_num + 1, page.get_text(), images
+    finally:
+        doc.close()
+
+def estimate_tokens(text):
+    return OllamaTokens.count_tokens(text, MODEL_NAME) + 1
+
+def iter_page_chunks(pdf_path, chunk_tokens, with_images=True, max_side=OllamaImages.DEFAULT_MAX_SIDE, cache_db=None):
+    # Group consecutive pages into chunks of at most `chunk_tokens` (a single
+    # oversized page still makes its own chunk). Only one chunk is held at a time.
+    index = 0
+    pages, images, tokens = [], [], 0
+    for page_num, text, page_images in iter_pdf_pages(pdf_path, with_images, cache_db):
+        cost = estimate_tokens(text) + IMAGE_TOKENS * len(page_images)
+        if pages and tokens + cost > chunk_tokens:
+            yield {"index": index, "first": pages[0][0], "last": pages[-1][0],
+                   "text": "\n".join(t for _, t in pages),
+                   "images": OllamaImages.encode_images_dedup(images, max_side)}
+            index += 1
+            pages, images, tokens = [], [], 0
+        pages.append((page_num, text))
+        images.extend(page_images)
+        tokens += cost
+    if pages:
+        yield {"index": index, "first": pages[0][0], "last": pages[-1][0],
+               "text": "\n".join(t for _, t in pages),
+               "images": OllamaImages.encode_images_dedup(images, max_side)}
+
+def map_chunk(chunk, question, num_ctx):
+    message = {
+        "role": "user",
+        "content": MAP_PROMPT.format(first=chunk["first"], last=chunk["last"], question=question) + chunk["text"]
+    }
+    if chunk["images"]:
+        message["images"] = chunk["images"]
+    reply, _ = OllamaChat.chat([message], MODEL_NAME, temperature=0.0, num_ctx=num_ctx, base_url=OLLAMA_BASE_URL)
+    return reply
+
+def reduce_results(results, question, chunk_tokens, num_ctx):
+    # Merge partial answers; merge in groups first when they do not fit one prompt
+    while len(results) > 1:
+        groups, group, tokens = [], [], 0
+        for result in results:
+            cost = estimate_tokens(result)
+            if group and tokens + cost > chunk_tokens:
+                groups.append(group)
+                group, tokens = [], 0
+            group.append(result)
+            tokens += cost
+        groups.append(group)
+        if len(groups) == len(results):
+            # Each partial answer is already too big to pair: merge them all at once
+            groups = [results]
+        merged = []
+        for group in groups:
+            if len(group) == 1:
+                merged.append(group[0])
+                continue
+            content = REDUCE_PROMPT.format(question=question) + "\n\n".join(
+                f"--- Part {i + 1} ---\n{r}" for i, r in enumerate(group))
+            reply, _ = OllamaChat.chat([{"role": "user", "content": content}], MODEL_NAME,
+                                       temperature=0.0, num_ctx=num_ctx, base_url=OLLAMA_BASE_URL)
+            if reply is None:
+                raise RuntimeError("Reduce step failed.")
+            merged.append(reply)
+        results = merged
+    return results[0] if results else ""
+
+def checkpoint_path(pdf_path, chunk_tokens, with_images=True):
+    # Chunk boundaries depend on the chunk size, the image cost and the token counter
+    safe_model = re.sub(r"[^\w.-]", "_", MODEL_NAME)
+    content = "images" if with_images else "text"
+    return f"{pdf_path}.{safe_model}.{chunk_tokens}.{content}.{OllamaTokens.MODE}.checkpoint.jsonl"
+
+def analyze_pdf_mapreduce(pdf_path, question, chunk_tokens=3000, workers=2, with_images=True, cache_db=None):
+    # Map: chunks are analyzed concurrently (at most 2 x workers chunks in memory).
+    # Each finished chunk is appended to a checkpoint so an interrupted run resumes.
+    num_ctx = chunk_tokens + 1024
+    checkpoint = checkpoint_path(pdf_path, chunk_tokens, with_images)
+    done = {}
+    if os.path.exists(checkpoint):
+        for entry in OllamaTranscript.read_interactions(checkpoint):
+            if entry.get("question") == question:
+                done[entry["index"]] = entry["result"]
+        print(f"Resuming: {len(done)} chunk(s) already analyzed ({checkpoint}).")
+
+    max_side = OllamaImages.max_side_for_model(MODEL_NAME)
+    results = dict(done)
+    pending = {}
+    failed = []
+
+    def collect(futures):
+        for future in futures:
+            chunk_info = pending.pop(future)
+            result = future.result()
+            if result is None:
+                failed.append(chunk_info)
+                continue
+            results[chunk_info[0]] = result
+            OllamaTranscript.append_interaction(checkpoint, {
+                "index": chunk_info[0], "pages": chunk_info[1:], "question": question, "result": result
+            }, fsync=True)
+            print(f"Chunk {chunk_info[0] + 1} (pages {chunk_info[1]}-{chunk_info[2]}) done.")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for chunk in iter_page_chunks(pdf_path, chunk_tokens, with_images, max_side, cache_db):
+            if chunk["index"] in done:
+                continue
+            future = executor.submit(map_chunk, chunk, question, num_ctx)
+            pending[future] = (chunk["index"], chunk["first"], chunk["last"])
+            if len(pending) >= 2 * workers:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+        finished, _ = wait(pending)
+        collect(finished)
+
+    if failed:
+        print(f"{len(failed)} chunk(s) failed: {[f'pages {a}-{b}' for _, a, b in failed]}. Run again to retry them.")
+        return None
+    print(f"Reducing {len(results)} partial answer(s)...")
+    return reduce_results([results[i] for i in sorted(results)], question, chunk_tokens, num_ctx)
+
+
 def parent_path(path):
     return os.path.dirname(path)
 
@@ -136,22 +311,38 @@ if __name__ == "__main__":
     parser.add_argument('--Model', type=str, default="llava", help='Model') # Multimodal model vision+text
     parser.add_argument('--URL', type=str, default="http://localhost:11434", help='Ollama server URL')
     parser.add_argument('--InputDataPDF', type=str, default="InputData.pdf", help='Input PDF data')
+    parser.add_argument('--Mode', type=str, default="single", choices=["single", "mapreduce"],
+                        help='single: whole PDF in one request, mapreduce: page chunks analyzed then merged')
+    parser.add_argument('--Question', type=str, default="Summarize this document and list its key points.",
+                        help='Task applied to each chunk and to the merge (mapreduce mode)')
+    parser.add_argument('--ChunkTokens', type=int, default=3000, help='Approximate tokens per chunk (mapreduce mode)')
+    parser.add_argument('--Workers', type=int, default=2, help='Chunks analyzed concurrently (mapreduce mode)')
+    parser.add_argument('--Images', type=int, default=1, help='Send the page images too (mapreduce mode, 1=yes, 0=no)')
+    parser.add_argument('--NoCache', action='store_true', help='Re-extract the PDF text, ignoring the extraction cache')
     
     args = parser.parse_args()
       
     input_up_folder = parent_path(args.Path)   
-    pdf_file = input_up_folder+"/"+args.InputData
+    pdf_file = input_up_folder+"/"+args.InputDataPDF
     print("INPUT_DATA="+pdf_file)
     
-    pdf_text = extract_text_from_pdf(pdf_file)
+    MODEL_NAME = args.Model
+    OLLAMA_BASE_URL = args.URL
+    OllamaClient.configure(base_url=OLLAMA_BASE_URL)
+    cache_db = None if args.NoCache else os.path.join(input_up_folder, OllamaDocuments.DOCUMENT_CACHE_DB)
+
+    if args.Mode == "mapreduce":
+        answer = analyze_pdf_mapreduce(pdf_file, args.Question, args.ChunkTokens, args.Workers, args.Images == 1, cache_db)
+        print("\nOllama model's response :")
+        print(answer)
+        sys.exit(0 if answer is not None else 1)
+    
+    pdf_text = extract_text_from_pdf(pdf_file, cache_db)
     print("Extracted text from PDF (first 500 characters):")
     print(pdf_text[:500] + "...\n")
     
-    images_b64 = extract_images_from_pdf(pdf_file)
+    images_b64 = extract_images_from_pdf(pdf_file, OllamaImages.max_side_for_model(MODEL_NAME))
     print(f"{len(images_b64)} images extracted and encoded in base64.")
-    
-    MODEL_NAME = args.Model
-    OLLAMA_BASE_URL = args.URL
 
     answer = ask_ollama_with_text_and_images(pdf_text, images_b64, OLLAMA_BASE_URL, MODEL_NAME)
     print("\nOllama model's response :")
@@ -0,0 +1,191 @@
+# Author(s): Dr. Patrick Lemoine
+# Retrieval-augmented enrichment: documents are cut into chunks, embedded with
+# Ollama /api/embed and stored in a SQLite file; for each question only the
+# top-k most similar chunks are injected into the prompt of the base model,
+# instead of baking the whole corpus into a new model's system prompt.
+
+import os
+import re
+import sys
+import hashlib
+import sqlite3
+import numpy as np
+import OllamaClient
+import OllamaBatch
+
+
+EMBED_MODEL = "nomic-embed-text"
+CHUNK_WORDS = 200
+CHUNK_OVERLAP = 40
+EMBED_BATCH = 32
+TOP_K = 5
+
+SYSTEM_PROMPT = (
+    "You are an expert assistant. "
+    "Respond ONLY using the context passages given with the question. "
+    "Do not invent information, do not use external knowledge. "
+    "If the passages do not contain the answer, say so."
+)
+
+SECTION_HEADER = re.compile(r"\n===== (.+?) =====\n")
+
+
+def split_sections(all_text, folder_path=None):
+    # Split the text built by concat_txt_and_pdf_from_folder back into (file, text);
+    # with folder_path, the file names become full paths (the source key of the index)
+    parts = SECTION_HEADER.split(all_text)
+    return [(os.path.join(folder_path, parts[i]) if folder_path else parts[i], parts[i + 1])
+            for i in range(1, len(parts) - 1, 2)]
+
+
+def chunk_text(text, chunk_words=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+    words = text.split()
+    step = max(1, chunk_words - overlap)
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(" ".join(words[start:start + chunk_words]))
+        if start + chunk_words >= len(words):
+            break
+    return chunks
+
+
+def embed(texts, embed_model=EMBED_MODEL, base_url=None):
+    vectors = []
+    for i in range(0, len(texts), EMBED_BATCH):
+        batch = texts[i:i + EMBED_BATCH]
+        response = OllamaClient.post(OllamaClient.api_url("/api/embed", base_url),
+                                     json={"model": embed_model, "input": batch})
+        if response.status_code != 200:
+            raise RuntimeError(f"Embedding error: {response.status_code} {response.text}")
+        vectors.extend(response.json()["embeddings"])
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def init_index(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sources (
+            source TEXT PRIMARY KEY,
+            digest TEXT,
+            embed_model TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS chunks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source TEXT,
+            chunk_index INTEGER,
+            content TEXT,
+            embedding BLOB
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS chunks_source ON chunks(source)')
+    conn.commit()
+    return conn
+
+
+def build_index(db_path, documents, embed_model=EMBED_MODEL, base_url=None, prune=False):
+    # documents: list of (source, text), source = full path of the file. Unchanged
+    # sources are not re-embedded. prune=True drops the sources not in documents
+    # (files removed from the folder); leave it off when indexing a subset.
+    conn = init_index(db_path)
+    try:
+        if prune:
+            keep = {source for source, _ in documents}
+            indexed = conn.execute('SELECT source FROM sources UNION SELECT source FROM chunks').fetchall()
+            stale = [row for row in indexed if row[0] not in keep]
+            conn.executemany('DELETE FROM chunks WHERE source=?', stale)
+            conn.executemany('DELETE FROM sources WHERE source=?', stale)
+            conn.commit()
+        for source, text in documents:
+            digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+            row = conn.execute('SELECT digest, embed_model FROM sources WHERE source=?', (source,)).fetchone()
+            if row == (digest, embed_model):
+                continue
+            chunks = chunk_text(text)
+            print(f"Embedding {len(chunks)} chunks from {source} ...")
+            vectors = embed(chunks, embed_model, base_url) if chunks else []
+            conn.execute('DELETE FROM chunks WHERE source=?', (source,))
+            conn.executemany(
+                'INSERT INTO chunks (source, chunk_index, content, embedding) VALUES (?, ?, ?, ?)',
+                [(source, i, chunk, vectors[i].tobytes()) for i, chunk in enumerate(chunks)]
+            )
+            conn.execute('INSERT OR REPLACE INTO sources (source, digest, embed_model) VALUES (?, ?, ?)',
+                         (source, digest, embed_model))
+            conn.commit()
+    finally:
+        conn.close()
+
+
+def load_index(db_path, embed_model=EMBED_MODEL, sources=None):
+    # Load (optionally a subset of) the chunks into a normalized NumPy matrix
+    conn = init_index(db_path)
+    try:
+        query = ('SELECT c.source, c.content, c.embedding FROM chunks c '
+                 'JOIN sources s ON s.source = c.source WHERE s.embed_model=?')
+        params = [embed_model]
+        if sources is not None:
+            query += f' AND c.source IN ({",".join("?" * len(sources))})'
+            params += list(sources)
+        rows = conn.execute(query, params).fetchall()
+    finally:
+        conn.close()
+    if rows:
+        matrix = np.vstack([np.frombuffer(r[2], dtype=np.float32) for r in rows])
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+    else:
+        matrix = np.zeros((0, 0), dtype=np.float32)
+    return {
+        "embed_model": embed_model,
+        "matrix": matrix,
+        "rows": [(r[0], r[1]) for r in rows]
+    }
+
+
+def search(index, question, top_k=TOP_K, base_url=None):
+    if not index["rows"]:
+        return []
+    query = embed([question], index["embed_model"], base_url)[0]
+    query /= np.linalg.norm(query) + 1e-12
+    scores = index["matrix"] @ query
+    best = np.argsort(-scores)[:top_k]
+    return [(float(scores[i]),) + index["rows"][i] for i in best]
+
+
+def retrieval_messages(index, question, top_k=TOP_K, base_url=None):
+    hits = search(index, question, top_k, base_url)
+    context = "\n\n".join(f"[{os.path.basename(source)}]\n{content}" for _, source, content in hits)
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"Context passages:\n{context}\n\nQuestion: {question}"}
+    ]
+
+
+def ask_question_rag(model_name, question, index, top_k=TOP_K):
+    messages = retrieval_messages(index, question, top_k)
+    response = OllamaClient.get_ollama_client().chat(model=model_name, messages=messages)
+    return response['message']['content']
+
+
+def batch_answer_fn(model_name, index, top_k=TOP_K):
+    # answer_fn for OllamaBatch.run_batch
+    def answer_fn(question, record):
+        answer, stats = OllamaBatch.chat_once(model_name, retrieval_messages(index, question, top_k))
+        return answer, dict(stats, model=model_name)
+    return answer_fn
+
+
+def chat_with_retrieval(model_name, index, top_k=TOP_K, first_question=None):
+    question = first_question
+    while True:
+        if question is None:
+            print("")
+            question = input("👦: ")
+        if question.strip().lower() in ["exit", "quit", ""]:
+            print("\nEnding conversation.")
+            sys.exit()
+        try:
+            print("\n🤖:", ask_question_rag(model_name, question, index, top_k))
+        except Exception as e:
+            print("Error calling Ollama :", e)
+        question = None
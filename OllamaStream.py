@@ -0,0 +1,92 @@
+# Author(s): Dr. Patrick Lemoine
+# Incremental reading of Ollama NDJSON streams (/api/generate and /api/chat),
+# with sentence hand-off to a background text-to-speech worker.
+
+import json
+import queue
+import re
+import time
+import threading
+import OllamaClient
+import OllamaMetrics
+
+
+SENTENCE_END = re.compile(r"(?<=[.!?…:;])\s+|\n+")
+
+
+def iter_ndjson(url, data, timeout=None):
+    data = dict(data, stream=True)
+    start = time.perf_counter()
+    with OllamaClient.post(url, json=data, stream=True, timeout=timeout) as response:
+        if response.status_code != 200:
+            OllamaMetrics.record(url, data.get("model"), {}, time.perf_counter() - start, response.status_code)
+            raise RuntimeError(f"Generation error: {response.status_code} {response.text}")
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if "error" in chunk:
+                raise RuntimeError(chunk["error"])
+            if chunk.get("done"):
+                OllamaMetrics.record(url, data.get("model"), chunk, time.perf_counter() - start)
+            yield chunk
+
+
+def chunk_text(chunk):
+    if "message" in chunk:
+        return chunk["message"].get("content", "")
+    return chunk.get("response", "")
+
+
+def stream_reply(url, data, prefix="🤖: ", on_sentence=None, timeout=None):
+    # Print tokens as they arrive and return (full text, final chunk with the stats)
+    print(prefix, end="", flush=True)
+    parts = []
+    pending = ""
+    final = {}
+    for chunk in iter_ndjson(url, data, timeout=timeout):
+        token = chunk_text(chunk)
+        if token:
+            print(token, end="", flush=True)
+            parts.append(token)
+            if on_sentence is not None:
+                pending += token
+                sentences = SENTENCE_END.split(pending)
+                for sentence in sentences[:-1]:
+                    if sentence.strip():
+                        on_sentence(sentence.strip())
+                pending = sentences[-1]
+        if chunk.get("done"):
+            final = chunk
+    print("")
+    if on_sentence is not None and pending.strip():
+        on_sentence(pending.strip())
+    return "".join(parts), final
+
+
+def start_speech_worker(init_engine):
+    # pyttsx3 engines must stay on the thread that created them, so the
+    # engine is built inside the worker. Put None in the queue to stop it.
+    sentences = queue.Queue()
+
+    def run():
+        engine = init_engine()
+        while True:
+            text = sentences.get()
+            try:
+                if text is None:
+                    return
+                engine.say(text)
+                engine.runAndWait()
+            except Exception as e:
+                print(f"Speech error: {e}")
+            finally:
+                sentences.task_done()
+
+    threading.Thread(target=run, daemon=True).start()
+    return sentences
+
+
+def stop_speech_worker(sentences):
+    sentences.put(None)
+    sentences.join()
@@ -2,9 +2,13 @@
 
 import os
 import json
+import time
+import queue
+import threading
 import subprocess
 import psutil
-import requests
+import OllamaClient
+import OllamaWarmup
 from datetime import datetime
 import pyttsx3
 import ollama
@@ -15,6 +19,9 @@ MODEL_NAMES = ["qwen2.5-coder:7b", "gpt-oss:20b", "deepseek-r1:8b"]
 
 SUMMARY_MODEL = "qwen2.5-coder:7b"
 
+# Optional per-model Ollama server, e.g. {"gpt-oss:20b": "http://gpu-box-2:11434"}
+MODEL_ENDPOINTS = {}
+
 JSON_PATH = "ollama_path.json"
 
 def save_path_to_json(path):
@@ -66,6 +73,9 @@ def is_ollama_running():
     return False
 
 def launch_ollama_if_needed():
+    if OllamaClient.is_server_ready():
+        print("Ollama is already running.")
+        return True
     path = load_path_from_json()
     if path is None or not os.path.isfile(path):
         path = find_ollama_executable()
@@ -74,17 +84,19 @@ def launch_ollama_if_needed():
         else:
             print("Ollama.exe not found on the system.")
             return False
+    # Not answering yet: the process scan tells a booting server from a stopped one
     if not is_ollama_running():
         subprocess.Popen([path, "serve"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
         print(f"Launching Ollama from: {path}")
-    else:
-        print("Ollama is already running.")
+    if not OllamaClient.wait_until_ready():
+        print(f"Ollama server not answering at {OllamaClient.OLLAMA_BASE_URL}.")
+        return False
     return True
 
 def list_models():
     try:
         url = f"{OLLAMA_BASE_URL}/api/tags"
-        response = requests.get(url)
+        response = OllamaClient.get(url)
         if response.status_code == 200:
             models = response.json().get("models", [])
             return [m["name"] for m in models]
@@ -95,17 +107,22 @@ def list_models():
         print(f"Error connecting to Ollama server: {e}")
         return []
 
-def ask_ollama(model, prompt, stream=False):
-    url = f"{OLLAMA_BASE_URL}/api/generate"
+def ask_ollama(model, prompt, stream=False, base_url=None, timeout=None):
+    url = f"{base_url or OLLAMA_BASE_URL}/api/generate"
     data = {
         "model": model,
         "prompt": prompt,
-        "stream": stream
+        "stream": stream,
+        "keep_alive": OllamaWarmup.keep_alive_for(model)
     }
     try:
-        response = requests.post(url, json=data)
+        if timeout:
+            response = OllamaClient.post(url, json=data, timeout=(OllamaClient.CONNECT_TIMEOUT, timeout))
+        else:
+            response = OllamaClient.post(url, json=data)
         if response.status_code == 200:
             result = response.json()
+            OllamaWarmup.report_load(model, result)
             return result.get("response", "No response field in reply.")
         else:
             print(f"Generation error: {response.status_code} {response.text}")
@@ -114,12 +131,61 @@ def ask_ollama(model, prompt, stream=False):
         print(f"Ollama request error: {e}")
         return None
 
+def list_models_at(base_url):
+    try:
+        response = OllamaClient.get(f"{base_url}/api/tags")
+        if response.status_code == 200:
+            return [m["name"] for m in response.json().get("models", [])]
+        print(f"Failed to fetch models from {base_url}: {response.status_code} {response.text}")
+    except Exception as e:
+        print(f"Error connecting to Ollama server {base_url}: {e}")
+    return []
+
+def ask_models_parallel(models, prompt, timeout=None, quorum=0):
+    # Query every model at the same time (each on its own endpoint if pinned).
+    # Returns [(model, response)] in completion order; stops waiting once
+    # `quorum` answers are in (0 = wait for all) or when `timeout` expires.
+    results = []
+    if not models:
+        return results
+    start = time.perf_counter()
+    answers = queue.Queue()
+
+    def worker(model):
+        answers.put((model, ask_ollama(model, prompt, False, MODEL_ENDPOINTS.get(model), timeout)))
+
+    # Daemon threads: late requests are abandoned and do not hold up the exit of the process
+    for model in models:
+        threading.Thread(target=worker, args=(model,), daemon=True).start()
+    deadline = start + timeout + OllamaClient.CONNECT_TIMEOUT if timeout else None
+    pending = list(models)
+    while pending:
+        remaining = deadline - time.perf_counter() if deadline else None
+        try:
+            if remaining is not None and remaining <= 0:
+                raise queue.Empty
+            model, response = answers.get(timeout=remaining)
+        except queue.Empty:
+            print(f"Timeout: no answer within {timeout}s from {pending}.")
+            break
+        pending.remove(model)
+        elapsed = time.perf_counter() - start
+        if response:
+            print(f"{model} Response ({elapsed:.1f}s) : {response}\n")
+            results.append((model, response))
+        else:
+            print(f"No response received from model {model}.\n")
+        if quorum and len(results) >= quorum:
+            print(f"Quorum of {quorum} answers reached, not waiting for the other models.")
+            break
+    return results
+
 def synthesize_responses(responses):
     combined = "\n\n".join(responses)
     synthesis_prompt = f"Please provide a concise synthesis of the following answers:\n{combined}"
     return ask_ollama(SUMMARY_MODEL, synthesis_prompt)
 
-def main(chat_path, use_speech):
+def main(chat_path, use_speech, timeout=None, quorum=0, warm_up=False):
     if use_speech:
         launch_speech_if_needed()
 
@@ -128,12 +194,18 @@ def main(chat_path, use_speech):
         return
 
     models_available = list_models()
-    missing = [m for m in MODEL_NAMES if m not in models_available]
+    missing = [m for m in MODEL_NAMES if m not in MODEL_ENDPOINTS and m not in models_available]
+    for model, base_url in MODEL_ENDPOINTS.items():
+        if model in MODEL_NAMES and model not in list_models_at(base_url):
+            missing.append(f"{model}@{base_url}")
     if missing:
         print(f"Missing local models: {missing}")
         print(f"Available models: {models_available}")
         return
 
+    if warm_up:
+        OllamaWarmup.warm_up_models(list(dict.fromkeys(MODEL_NAMES + [SUMMARY_MODEL])), OLLAMA_BASE_URL, MODEL_ENDPOINTS)
+
     os.makedirs(chat_path, exist_ok=True)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = os.path.join(chat_path, f"ollama_conversation_{timestamp}.txt")
@@ -141,17 +213,10 @@ def main(chat_path, use_speech):
     user_input = input("👦: ")
 
     print("Starting queries to local models...")
-    responses = []
     for model in MODEL_NAMES:
-        print(f"Querying the model : {model}")
-            
-        response = ask_ollama(model, user_input)
-        
-        if response:
-            print(f"{model} Response : {response}\n")
-            responses.append(response)
-        else:
-            print(f"No response received from model {model}.\n")
+        print(f"Querying the model : {model} ({MODEL_ENDPOINTS.get(model, OLLAMA_BASE_URL)})")
+    answers = ask_models_parallel(MODEL_NAMES, user_input, timeout, quorum)
+    responses = [response for _, response in answers]
 
     if not responses:
         print("No valid response received, ending.")
@@ -170,8 +235,8 @@ def main(chat_path, use_speech):
 
     # Saving to file
     with open(filename, "w", encoding="utf-8") as f:
-        for i, model_response in enumerate(responses):
-            f.write(f"Response from {MODEL_NAMES[i]}:\n{model_response}\n\n")
+        for model, model_response in answers:
+            f.write(f"Response from {model}:\n{model_response}\n\n")
         f.write("Final Synthesis:\n")
         f.write(synthesis or "")
 
@@ -187,12 +252,28 @@ if __name__ == "__main__":
     parser.add_argument("--Models", type=str, default="qwen2.5-coder:7b,gpt-oss:20b,deepseek-r1:8b",
                         help="List of local models, separated by commas")
     parser.add_argument("--SummaryModel", type=str, default="qwen2.5-coder:7b", help="Synthesis model")
+    parser.add_argument("--Endpoints", type=str, default="",
+                        help="Pin models to other Ollama servers: model=URL, separated by commas")
+    parser.add_argument("--Timeout", type=float, default=0, help="Per-model timeout in seconds (0 = none)")
+    parser.add_argument("--Quorum", type=int, default=0,
+                        help="Synthesize as soon as this many answers are in (0 = wait for all models)")
+    parser.add_argument("--WarmUp", type=int, default=0, help="Preload the models before the question (1 or 0)")
+    parser.add_argument("--KeepAlive", type=str, default=OllamaWarmup.KEEP_ALIVE,
+                        help="How long models stay loaded after a request (e.g. 30m, 2h, -1 = forever)")
+    parser.add_argument("--KeepAlivePerModel", type=str, default="",
+                        help="Per-model residency: model=duration, separated by commas")
 
     args = parser.parse_args()
 
     OLLAMA_BASE_URL = args.URL
+    OllamaClient.configure(base_url=OLLAMA_BASE_URL)
     MODEL_NAMES = [m.strip() for m in args.Models.split(",")]
     SUMMARY_MODEL = args.SummaryModel
+    for item in filter(None, (e.strip() for e in args.Endpoints.split(","))):
+        model, _, base_url = item.partition("=")
+        MODEL_ENDPOINTS[model.strip()] = base_url.strip().rstrip("/")
+
+    OllamaWarmup.configure(args.KeepAlive, args.KeepAlivePerModel)
 
-    main(args.Path, args.Speech == 1)
+    main(args.Path, args.Speech == 1, args.Timeout or None, args.Quorum, args.WarmUp == 1)
 
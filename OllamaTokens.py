@@ -0,0 +1,136 @@
+# Author(s): Dr. Patrick Lemoine
+# Token counting for num_ctx sizing. Two interchangeable counters:
+#   - "estimate": fast, streams files block by block (never loads a whole file),
+#   - "exact": the model's real tokenizer (HuggingFace `tokenizers`, loaded once
+#     per model), falling back to the estimate when it is not available.
+# num_ctx_for() turns a token count into a num_ctx with room for the dialogue.
+
+import os
+import math
+import threading
+
+
+MODE = os.environ.get("OLLAMA_TOKEN_COUNTER", "estimate")     # "estimate" or "exact"
+CHARS_PER_TOKEN = 3.5       # conservative average for BPE tokenizers on prose/code
+BLOCK_CHARS = 1 << 20       # characters read per block when counting a file
+MAX_CARRY_CHARS = BLOCK_CHARS   # text without whitespace (minified JSON, base64) is cut here anyway
+
+# Local tokenizer files (<TOKENIZER_DIR>/<family>.json) are used first,
+# otherwise the tokenizer is fetched once from the HuggingFace hub
+TOKENIZER_DIR = os.environ.get("OLLAMA_TOKENIZER_DIR", "tokenizers")
+TOKENIZERS = {
+    "qwen2.5": "Qwen/Qwen2.5-7B-Instruct",
+    "qwen2.5-coder": "Qwen/Qwen2.5-Coder-7B-Instruct",
+    "qwen3": "Qwen/Qwen3-8B",
+    "llama3": "NousResearch/Meta-Llama-3-8B-Instruct",
+    "llama3.1": "NousResearch/Meta-Llama-3.1-8B-Instruct",
+    "llama3.2": "unsloth/Llama-3.2-3B-Instruct",
+    "mistral": "mistralai/Mistral-7B-Instruct-v0.3",
+    "gemma2": "unsloth/gemma-2-9b-it",
+    "gemma3": "unsloth/gemma-3-4b-it",
+    "phi3": "microsoft/Phi-3-mini-4k-instruct",
+}
+DEFAULT_MODEL = "qwen2.5-coder:7b"
+
+# num_ctx sizing
+NUM_CTX_MARGIN = 1024       # tokens left for the questions and the answers
+NUM_CTX_MIN = 4096
+NUM_CTX_STEP = 1024
+MAX_CONTEXT = {
+    "qwen2.5": 32768,
+    "qwen2.5-coder": 32768,
+    "qwen3": 40960,
+    "llama3": 8192,
+    "llama3.1": 131072,
+    "llama3.2": 131072,
+    "mistral": 32768,
+    "gemma2": 8192,
+    "gemma3": 131072,
+    "phi3": 4096,
+}
+
+_tokenizers = {}
+_lock = threading.Lock()
+
+
+def configure(mode=None):
+    global MODE
+    if mode is not None:
+        if mode not in ("estimate", "exact"):
+            raise ValueError(f"Unknown token counter: {mode}")
+        MODE = mode
+
+
+def model_family(model):
+    return (model or DEFAULT_MODEL).split(":")[0].split("/")[-1]
+
+
+def get_tokenizer(model=None):
+    # Returns the tokenizer of `model` (cached), or None if it cannot be loaded
+    family = model_family(model)
+    with _lock:
+        if family in _tokenizers:
+            return _tokenizers[family]
+        tokenizer = None
+        try:
+            from tokenizers import Tokenizer
+            local = os.path.join(TOKENIZER_DIR, f"{family}.json")
+            if os.path.isfile(local):
+                tokenizer = Tokenizer.from_file(local)
+            elif family in TOKENIZERS:
+                tokenizer = Tokenizer.from_pretrained(TOKENIZERS[family])
+            else:
+                print(f"No tokenizer known for '{family}', using the estimate.")
+        except Exception as e:
+            print(f"Tokenizer for '{family}' unavailable ({e}), using the estimate.")
+        _tokenizers[family] = tokenizer
+        return tokenizer
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def count_tokens(text, model=None, mode=None):
+    if (mode or MODE) == "exact":
+        tokenizer = get_tokenizer(model)
+        if tokenizer is not None:
+            return len(tokenizer.encode(text, add_special_tokens=False).ids)
+    return estimate_tokens(text)
+
+
+def count_file_tokens(filepath, model=None, mode=None, encoding='utf-8'):
+    # Streams the file by blocks; blocks are cut after the last whitespace so
+    # that no token is split between two blocks in exact mode (a run longer
+    # than MAX_CARRY_CHARS without whitespace is cut where it is)
+    total = 0
+    carry = ""
+    with open(filepath, 'r', encoding=encoding) as f:
+        while True:
+            block = f.read(BLOCK_CHARS)
+            if not block:
+                break
+            block = carry + block
+            cut = max(block.rfind(" "), block.rfind("\n"))
+            if cut <= 0:
+                if len(block) <= MAX_CARRY_CHARS:
+                    carry = block
+                    continue
+                cut = len(block)
+            total += count_tokens(block[:cut], model, mode)
+            carry = block[cut:]
+    if carry:
+        total += count_tokens(carry, model, mode)
+    return total
+
+
+def num_ctx_for(nb_tokens, model=None, margin=NUM_CTX_MARGIN):
+    # Smallest multiple of NUM_CTX_STEP holding the text plus `margin`,
+    # bounded by the model's trained context length
+    num_ctx = max(NUM_CTX_MIN, math.ceil((nb_tokens + margin) / NUM_CTX_STEP) * NUM_CTX_STEP)
+    limit = MAX_CONTEXT.get(model_family(model))
+    if limit and num_ctx > limit:
+        print(f"Warning: {nb_tokens} tokens exceed the {limit}-token context of {model or DEFAULT_MODEL}, "
+              f"the text will be truncated.")
+        num_ctx = limit
+    return num_ctx
@@ -0,0 +1,112 @@
+# Author(s): Dr. Patrick Lemoine
+# Append-only JSONL conversation transcripts: one interaction per line, the
+# file is never re-read or rewritten during a session. Lines are flushed to the
+# OS every FLUSH_EVERY interactions and optionally fsync'ed. At most
+# MAX_OPEN_FILES files stay open (the least recently written is closed).
+# jsonl_to_json() converts a transcript back to the former JSON array format.
+
+import os
+import json
+import atexit
+import threading
+from collections import OrderedDict
+
+
+FLUSH_EVERY = 1     # interactions buffered before a flush
+FSYNC = False       # also fsync after each flush (survives a power loss, slower)
+MAX_OPEN_FILES = 8  # transcripts kept open at once
+
+_files = OrderedDict()
+_pending = {}
+_lock = threading.Lock()
+
+
+def configure(flush_every=None, fsync=None):
+    global FLUSH_EVERY, FSYNC
+    if flush_every is not None:
+        FLUSH_EVERY = max(1, flush_every)
+    if fsync is not None:
+        FSYNC = bool(fsync)
+
+
+def append_interaction(filepath, interaction, fsync=None):
+    line = json.dumps(interaction, ensure_ascii=False) + "\n"
+    with _lock:
+        f = _files.get(filepath)
+        if f is None:
+            f = open(filepath, "a", encoding="utf-8")
+            if f.tell() > 0 and not _ends_with_newline(filepath):
+                # Previous session crashed mid-line: start on a fresh line
+                f.write("\n")
+            _files[filepath] = f
+            _pending[filepath] = 0
+            if len(_files) > MAX_OPEN_FILES:
+                _close(next(iter(_files)))
+        else:
+            _files.move_to_end(filepath)
+        f.write(line)
+        _pending[filepath] += 1
+        if _pending[filepath] >= FLUSH_EVERY:
+            _flush(filepath, FSYNC if fsync is None else fsync)
+
+
+def _ends_with_newline(filepath):
+    with open(filepath, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def _flush(filepath, fsync):
+    f = _files[filepath]
+    f.flush()
+    if fsync:
+        os.fsync(f.fileno())
+    _pending[filepath] = 0
+
+
+def _close(filepath):
+    _flush(filepath, FSYNC)
+    _files.pop(filepath).close()
+    del _pending[filepath]
+
+
+def close_all():
+    with _lock:
+        for filepath in list(_files):
+            _close(filepath)
+
+
+atexit.register(close_all)
+
+
+def read_interactions(filepath):
+    interactions = []
+    with open(filepath, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                interactions.append(json.loads(line))
+            except json.JSONDecodeError:
+                # Typically a last line cut by a crash
+                print(f"Skipping unreadable line {number} in {filepath}")
+    return interactions
+
+
+def jsonl_to_json(jsonl_path, json_path=None):
+    if json_path is None:
+        json_path = os.path.splitext(jsonl_path)[0] + ".json"
+    data = read_interactions(jsonl_path)
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    return json_path
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Convert JSONL transcripts to the JSON array format.")
+    parser.add_argument('--Input', type=str, required=True, help='Transcript .jsonl file')
+    parser.add_argument('--Output', type=str, default=None, help='Output .json file (default: same name)')
+    args = parser.parse_args()
+
+    print("JSON saved to:", jsonl_to_json(args.Input, args.Output))
@@ -0,0 +1,109 @@
+# Author(s): Dr. Patrick Lemoine
+# Model residency: a keep_alive policy (default and per-model durations) sent
+# with the requests, a warm-up that preloads models with an empty request, and
+# a report of load_duration so that cold starts (model read from disk) show up.
+
+import os
+import OllamaClient
+
+
+KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")     # default residency after the last request
+KEEP_ALIVE_PER_MODEL = {}                               # e.g. {"deepseek-r1:8b": "1h"}
+COLD_START = 1.0        # seconds of load_duration reported as a cold start
+
+
+def configure(keep_alive=None, per_model=None):
+    # per_model: dict or "model=duration,..." string
+    global KEEP_ALIVE
+    if keep_alive:
+        KEEP_ALIVE = keep_alive
+    if isinstance(per_model, str):
+        per_model = dict(item.split("=", 1) for item in per_model.split(",") if "=" in item)
+    for model, duration in (per_model or {}).items():
+        KEEP_ALIVE_PER_MODEL[model.strip()] = duration.strip()
+
+
+def keep_alive_value(value):
+    # Ollama parses string durations with a unit ("30m", "-1m"); bare numbers must be sent as numbers (seconds)
+    if isinstance(value, str) and value.strip().lstrip('-').isdigit():
+        return int(value)
+    return value
+
+
+def keep_alive_for(model):
+    return keep_alive_value(KEEP_ALIVE_PER_MODEL.get(model, KEEP_ALIVE_PER_MODEL.get(model.split(":")[0], KEEP_ALIVE)))
+
+
+def report_load(model, stats):
+    # load_duration is in nanoseconds in the final chunk/response of Ollama
+    seconds = (stats or {}).get("load_duration", 0) / 1e9
+    if seconds >= COLD_START:
+        print(f"Cold start: '{model}' loaded in {seconds:.1f}s")
+    return seconds
+
+
+def warm_up(model, base_url=None, keep_alive=None):
+    # An empty request loads the model and keeps it resident; returns load_duration in seconds
+    keep_alive = keep_alive_value(keep_alive) if keep_alive is not None else keep_alive_for(model)
+    response = OllamaClient.post(OllamaClient.api_url("/api/generate", base_url),
+                                 json={"model": model, "keep_alive": keep_alive})
+    if response.status_code != 200 and "generate" in response.text:
+        # Embedding-only models
+        response = OllamaClient.post(OllamaClient.api_url("/api/embed", base_url),
+                                     json={"model": model, "input": "", "keep_alive": keep_alive})
+    if response.status_code != 200:
+        raise RuntimeError(f"{response.status_code} {response.text}")
+    return response.json().get("load_duration", 0) / 1e9
+
+
+def warm_up_models(models, base_url=None, endpoints=None):
+    # Models are loaded one after the other (parallel loads only compete for disk and memory).
+    # endpoints: optional {model: base_url} for models served elsewhere.
+    loaded = {}
+    for model in models:
+        url = (endpoints or {}).get(model, base_url)
+        try:
+            loaded[model] = warm_up(model, url)
+            print(f"Warm-up '{model}': load_duration {loaded[model]:.1f}s, keep_alive {keep_alive_for(model)}")
+        except Exception as e:
+            print(f"Warm-up of '{model}' failed: {e}")
+    return loaded
+
+
+def unload(model, base_url=None):
+    OllamaClient.post(OllamaClient.api_url("/api/generate", base_url), json={"model": model, "keep_alive": 0})
+
+
+def resident_models(base_url=None):
+    # [(name, expires_at, size_vram)] from /api/ps
+    try:
+        response = OllamaClient.get(OllamaClient.api_url("/api/ps", base_url))
+        response.raise_for_status()
+        return [(m["name"], m.get("expires_at", ""), m.get("size_vram", 0))
+                for m in response.json().get("models", [])]
+    except Exception as e:
+        print(f"Error connecting to Ollama server: {e}")
+        return []
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Preload Ollama models and keep them resident.")
+    parser.add_argument('--URL', type=str, default="http://localhost:11434", help='Ollama server URL')
+    parser.add_argument('--Models', type=str, default="qwen2.5-coder:7b,gpt-oss:20b,deepseek-r1:8b",
+                        help='Models to preload, separated by commas')
+    parser.add_argument('--KeepAlive', type=str, default=KEEP_ALIVE, help='Residency after the last request (e.g. 30m, 2h, -1 = forever, bare numbers are seconds)')
+    parser.add_argument('--KeepAlivePerModel', type=str, default="", help='Per-model residency: model=duration, separated by commas')
+    parser.add_argument('--Unload', action='store_true', help='Unload the models instead')
+    args = parser.parse_args()
+
+    OllamaClient.configure(base_url=args.URL)
+    configure(args.KeepAlive, args.KeepAlivePerModel)
+    models = [m.strip() for m in args.Models.split(",") if m.strip()]
+    if args.Unload:
+        for model in models:
+            unload(model)
+    else:
+        warm_up_models(models)
+    for name, expires_at, size_vram in resident_models():
+        print(f"{name:40s} {size_vram / 1e9:6.1f} GB VRAM  until {expires_at}")
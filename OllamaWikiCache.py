@@ -0,0 +1,304 @@
+# Author(s): Dr. Patrick Lemoine
+# Persistent SQLite cache of the Wikipedia fetches made by the Wiki scripts:
+# search results, pages (summary, content, images, links, sections,
+# categories) and downloaded images, keyed by normalized text and language.
+# Entries younger than their TTL are used as they are; older ones are
+# revalidated with a conditional request (ETag / Last-Modified) and only
+# downloaded again when Wikipedia reports a change. Offline, every cached
+# entry is used whatever its age. The cache is bounded in size (LRU eviction).
+
+import re
+import json
+import time
+import sqlite3
+import unicodedata
+from urllib.parse import quote
+import requests
+import wikipedia
+
+
+WIKI_CACHE_DB = "wikipedia_cache.db"
+SCHEMA_VERSION = 2                  # older cache files are dropped and rebuilt
+CACHE_MAX_BYTES = 256 * 1024 * 1024     # searches, pages and images kept (least recently used evicted)
+SEARCH_TTL = 7 * 24 * 3600          # seconds before a search is run again
+PAGE_TTL = 30 * 24 * 3600           # seconds before a page is revalidated
+IMAGE_TTL = 90 * 24 * 3600          # seconds before an image is revalidated
+REQUEST_TIMEOUT = 10
+
+# Wikimedia asks for a descriptive User-Agent
+HEADERS = {"User-Agent": "OllamaEnrichment/1.0 (Wikipedia cache; python-requests)"}
+REST_SUMMARY_URL = "https://{lang}.wikipedia.org/api/rest_v1/page/summary/{title}"
+TABLES = ("searches", "pages", "images")
+
+
+def normalize(text):
+    # Same key for "Marie  Curie", "marie_curie" and "MARIE CURIE"
+    text = unicodedata.normalize("NFKC", text).replace("_", " ")
+    return " ".join(text.split()).casefold()
+
+
+def init_cache(db_path):
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    if c.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+        for table in TABLES:
+            c.execute(f'DROP TABLE IF EXISTS {table}')
+        c.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS searches (
+            lang TEXT,
+            query TEXT,
+            results TEXT,
+            fetched REAL,
+            size INTEGER,
+            last_used REAL,
+            PRIMARY KEY (lang, query)
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS pages (
+            lang TEXT,
+            key TEXT,
+            title TEXT,
+            url TEXT,
+            summary TEXT,
+            content TEXT,
+            images TEXT,
+            links TEXT,
+            sections TEXT,
+            categories TEXT,
+            etag TEXT,
+            fetched REAL,
+            size INTEGER,
+            last_used REAL,
+            PRIMARY KEY (lang, key)
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS images (
+            url TEXT PRIMARY KEY,
+            data BLOB,
+            etag TEXT,
+            last_modified TEXT,
+            fetched REAL,
+            size INTEGER,
+            last_used REAL
+        )
+    ''')
+    for table in TABLES:
+        c.execute(f'CREATE INDEX IF NOT EXISTS {table}_last_used ON {table}(last_used)')
+    conn.commit()
+    conn.close()
+
+
+def is_fresh(fetched, ttl):
+    return time.time() - fetched < ttl
+
+
+def touch(db_path, table, where, params, refreshed=False):
+    # Marks an entry as used (LRU); refreshed=True also restarts its TTL
+    now = time.time()
+    conn = sqlite3.connect(db_path)
+    if refreshed:
+        conn.execute(f'UPDATE {table} SET last_used=?, fetched=? WHERE {where}', [now, now] + list(params))
+    else:
+        conn.execute(f'UPDATE {table} SET last_used=? WHERE {where}', [now] + list(params))
+    conn.commit()
+    conn.close()
+
+
+def evict(conn):
+    # LRU eviction beyond CACHE_MAX_BYTES over the three tables
+    rows = conn.execute(' UNION ALL '.join(
+        f"SELECT '{table}', rowid, size, last_used FROM {table}" for table in TABLES) +
+        ' ORDER BY last_used DESC').fetchall()
+    total = 0
+    for table, rowid, size, _ in rows:
+        total += size or 0
+        if total > CACHE_MAX_BYTES:
+            conn.execute(f'DELETE FROM {table} WHERE rowid=?', (rowid,))
+
+
+# ---- Search --------------------------------
+def search(db_path, query, lang="en", online=True):
+    # wikipedia.search(query) through the cache; offline, a miss raises LookupError
+    init_cache(db_path)
+    key = normalize(query)
+    conn = sqlite3.connect(db_path)
+    row = conn.execute('SELECT results, fetched FROM searches WHERE lang=? AND query=?', (lang, key)).fetchone()
+    conn.close()
+    if row and (not online or is_fresh(row[1], SEARCH_TTL)):
+        touch(db_path, 'searches', 'lang=? AND query=?', (lang, key))
+        return json.loads(row[0])
+    if not online:
+        raise LookupError(f"Offline and '{query}' is not in the Wikipedia cache")
+    wikipedia.set_lang(lang)
+    try:
+        results = wikipedia.search(query)
+    except Exception as e:
+        if row:
+            print(f"[Warning] Wikipedia search failed, using the cached results: {e}")
+            return json.loads(row[0])
+        raise
+    data = json.dumps(results)
+    now = time.time()
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+        INSERT OR REPLACE INTO searches (lang, query, results, fetched, size, last_used)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (lang, key, data, now, len(data), now))
+    evict(conn)
+    conn.commit()
+    conn.close()
+    return results
+
+
+def has_search(db_path, query, lang="en"):
+    init_cache(db_path)
+    conn = sqlite3.connect(db_path)
+    row = conn.execute('SELECT 1 FROM searches WHERE lang=? AND query=?', (lang, normalize(query))).fetchone()
+    conn.close()
+    return row is not None
+
+
+# ---- Pages --------------------------------
+PAGE_FIELDS = ("title", "url", "summary", "content", "images", "links", "sections", "categories", "etag", "fetched")
+JSON_FIELDS = ("images", "links", "sections", "categories")
+
+
+def first_sentences(text, sentences):
+    parts = re.split(r'(?<=[.!?])\s+', text.strip())
+    return " ".join(parts[:sentences])
+
+
+def get_page_entry(db_path, title, lang):
+    conn = sqlite3.connect(db_path)
+    row = conn.execute(f'SELECT {", ".join(PAGE_FIELDS)} FROM pages WHERE lang=? AND key=?',
+                       (lang, normalize(title))).fetchone()
+    conn.close()
+    if row is None:
+        return None
+    entry = dict(zip(PAGE_FIELDS, row))
+    for field in JSON_FIELDS:
+        entry[field] = json.loads(entry[field])
+    return entry
+
+
+def save_page_entry(db_path, title, lang, entry):
+    values = [json.dumps(entry[f]) if f in JSON_FIELDS else entry[f] for f in PAGE_FIELDS]
+    size = sum(len(v) for v in values if isinstance(v, str))
+    conn = sqlite3.connect(db_path)
+    conn.execute(f'''
+        INSERT OR REPLACE INTO pages (lang, key, {", ".join(PAGE_FIELDS)}, size, last_used)
+        VALUES (?, ?, {", ".join("?" * len(PAGE_FIELDS))}, ?, ?)
+    ''', [lang, normalize(title)] + values + [size, time.time()])
+    evict(conn)
+    conn.commit()
+    conn.close()
+
+
+def rest_summary(title, lang, etag=None):
+    # One REST call: (status, etag, intro extract or None); 304 when etag still matches
+    url = REST_SUMMARY_URL.format(lang=lang, title=quote(title.replace(" ", "_"), safe=""))
+    headers = dict(HEADERS)
+    if etag:
+        headers["If-None-Match"] = etag
+    response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+    extract = response.json().get("extract") if response.status_code == 200 else None
+    return response.status_code, response.headers.get("ETag", etag), extract
+
+
+def fetch_page(title, lang, summary=None, etag=None):
+    # Full download; DisambiguationError / PageError are raised to the caller.
+    # The intro and the ETag come from the same REST summary call.
+    wikipedia.set_lang(lang)
+    page = wikipedia.page(title, auto_suggest=False)
+    if summary is None:
+        try:
+            _, etag, summary = rest_summary(page.title, lang)
+        except (requests.RequestException, ValueError):
+            etag = None
+    content = page.content
+    if not summary:
+        # Intro of the article: the text before its first section heading
+        summary = re.split(r'\n\n+==', content, maxsplit=1)[0]
+    return {
+        "title": page.title,
+        "url": page.url,
+        "summary": summary,
+        "content": content,
+        "images": page.images,
+        "links": page.links,
+        "sections": page.sections,
+        "categories": page.categories,
+        "etag": etag,
+        "fetched": time.time(),
+    }
+
+
+def page(db_path, title, lang="en", sentences=1000, online=True):
+    # Page data as a dict (see PAGE_FIELDS), summary cut to `sentences`;
+    # offline, a miss raises LookupError
+    init_cache(db_path)
+    key = (lang, normalize(title))
+    entry = get_page_entry(db_path, title, lang)
+    summary = etag = None
+    if entry is not None:
+        if not online or is_fresh(entry["fetched"], PAGE_TTL):
+            touch(db_path, 'pages', 'lang=? AND key=?', key)
+            return dict(entry, summary=first_sentences(entry["summary"], sentences))
+        if entry["etag"]:
+            try:
+                status, etag, summary = rest_summary(entry["title"], lang, entry["etag"])
+                if status == 304:
+                    touch(db_path, 'pages', 'lang=? AND key=?', key, refreshed=True)
+                    return dict(entry, summary=first_sentences(entry["summary"], sentences))
+            except (requests.RequestException, ValueError) as e:
+                print(f"[Warning] Could not revalidate '{title}', using the cached page: {e}")
+                return dict(entry, summary=first_sentences(entry["summary"], sentences))
+    elif not online:
+        raise LookupError(f"Offline and '{title}' is not in the Wikipedia cache")
+    entry = fetch_page(title, lang, summary, etag)
+    save_page_entry(db_path, title, lang, entry)
+    return dict(entry, summary=first_sentences(entry["summary"], sentences))
+
+
+# ---- Images --------------------------------
+def image(db_path, url, online=True):
+    # Image bytes, or None when neither the cache nor the network has them
+    init_cache(db_path)
+    conn = sqlite3.connect(db_path)
+    row = conn.execute('SELECT data, etag, last_modified, fetched FROM images WHERE url=?', (url,)).fetchone()
+    conn.close()
+    if row and (not online or is_fresh(row[3], IMAGE_TTL)):
+        touch(db_path, 'images', 'url=?', (url,))
+        return row[0]
+    if not online:
+        return None
+    headers = dict(HEADERS)
+    if row and row[1]:
+        headers["If-None-Match"] = row[1]
+    if row and row[2]:
+        headers["If-Modified-Since"] = row[2]
+    try:
+        response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+        if response.status_code == 304 and row:
+            touch(db_path, 'images', 'url=?', (url,), refreshed=True)
+            return row[0]
+        response.raise_for_status()
+    except requests.RequestException as e:
+        if row:
+            print(f"[Warning] Could not revalidate the image, using the cached copy: {e}")
+            return row[0]
+        raise
+    data = response.content
+    now = time.time()
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+        INSERT OR REPLACE INTO images (url, data, etag, last_modified, fetched, size, last_used)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (url, data, response.headers.get("ETag"), response.headers.get("Last-Modified"), now, len(data), now))
+    evict(conn)
+    conn.commit()
+    conn.close()
+    return data
@@ -0,0 +1,189 @@
+# Author(s): Dr. Patrick Lemoine
+# Long-running HTTP service around the OllamaModelEnrichmentDocsSqliteWiki
+# pipeline (person-name extraction, SQLite keyword search with Wikipedia
+# fallback, then the question to the model). The NLP libraries and spaCy
+# models are loaded once at startup; requests are served concurrently by an
+# asyncio (aiohttp) server. NLP and corpus search run on dedicated worker
+# threads, calls to Ollama are bounded by a semaphore, and requests beyond
+# the queue limit are refused with 503.
+#
+#   POST /ask       {"question": "...", "mode": "model"|"rag"}
+#   POST /keywords  {"text": "..."}
+#   POST /search    {"keywords": ["...", ...]}
+#   GET  /health
+
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web
+import OllamaClient
+import OllamaModelEnrichmentDocsSqliteWiki as Wiki
+
+
+OLLAMA_CONCURRENCY = 2      # simultaneous requests sent to Ollama
+MAX_QUEUE = 64              # requests waiting or running before answering 503
+SENTENCES = 1000
+
+
+class WikiService:
+    def __init__(self, folder_path, model, name_new_model, ner="all", embed_model="nomic-embed-text",
+                 top_k=5, ollama_concurrency=OLLAMA_CONCURRENCY, max_queue=MAX_QUEUE):
+        self.folder_path = folder_path
+        self.model = model
+        self.name_new_model = name_new_model
+        self.ner = ner
+        self.embed_model = embed_model
+        self.top_k = top_k
+        self.max_queue = max_queue
+        self.ollama_concurrency = ollama_concurrency
+        # spaCy pipelines are not shared between threads: one NLP thread
+        self.nlp_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="nlp")
+        # Index updates and Wikipedia downloads write the corpus: one search thread
+        self.search_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search")
+        # Retrieval index writes and derived-model create/gc (registry DB): one build thread
+        self.build_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="build")
+        self.ollama_executor = ThreadPoolExecutor(max_workers=ollama_concurrency, thread_name_prefix="ollama")
+        # Blocking /api/version probe of /health, kept off the event loop and the busy workers
+        self.probe_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="probe")
+        self.ollama_slots = None
+        self.in_flight = 0
+        self.served = 0
+
+    async def start(self, app):
+        self.ollama_slots = asyncio.Semaphore(self.ollama_concurrency)
+        models = [Wiki.SPACY_MODELS[lang] for lang in Wiki.SUPPORTED_LANGS]
+        disable = ()
+        if self.ner == "routed":
+            models.append(Wiki.MULTILINGUAL_SPACY_MODEL)
+            disable = Wiki.NER_ONLY_DISABLE
+        await self.run(self.nlp_executor, Wiki.preload, models, disable)
+        print(f"Service ready: corpus {self.folder_path}, model {self.model}, "
+              f"{self.ollama_concurrency} concurrent Ollama request(s).")
+
+    async def stop(self, app):
+        for executor in (self.nlp_executor, self.search_executor, self.build_executor, self.ollama_executor,
+                         self.probe_executor):
+            executor.shutdown(wait=False)
+
+    async def run(self, executor, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
+    async def ollama(self, fn, *args):
+        async with self.ollama_slots:
+            return await self.run(self.ollama_executor, fn, *args)
+
+    def extract_keywords(self, text):
+        if self.ner == "routed":
+            return Wiki.extract_person_names_routed(text)
+        return Wiki.extract_person_names2(text)
+
+    async def answer(self, question, mode):
+        keywords = await self.run(self.nlp_executor, self.extract_keywords, question)
+        files = await self.run(self.search_executor, Wiki.find_files, self.folder_path, keywords, SENTENCES)
+        answers = []
+        if files and mode == "rag":
+            # Builds queue on their own thread without holding an Ollama slot
+            index = await self.run(self.build_executor, Wiki.build_file_index, self.folder_path, files,
+                                   self.embed_model)
+            answers.append({"model": self.model,
+                            "answer": await self.ollama(Wiki.ask_model, self.model, question, index, self.top_k)})
+        else:
+            for filepath in files:
+                model_name = await self.run(self.build_executor, Wiki.model_for_file, self.name_new_model, filepath)
+                answers.append({"model": model_name, "file": filepath,
+                                "answer": await self.ollama(Wiki.ask_model, model_name, question)})
+        return {"question": question, "keywords": keywords, "files": files, "answers": answers}
+
+    # ---- HTTP handlers --------------------------------
+    @web.middleware
+    async def admission(self, request, handler):
+        # Bounded queue: refuse instead of piling up requests in front of Ollama
+        if request.path == "/health":
+            return await handler(request)
+        if self.in_flight >= self.max_queue:
+            return web.json_response({"error": "server busy, retry later"}, status=503,
+                                     headers={"Retry-After": "5"})
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            return await handler(request)
+        except web.HTTPException:
+            raise
+        except Exception as e:
+            print(f"Error on {request.path}: {e}")
+            return web.json_response({"error": str(e)}, status=500)
+        finally:
+            self.in_flight -= 1
+            self.served += 1
+            print(f"{request.method} {request.path} {time.perf_counter() - start:.2f}s")
+
+    async def read_json(self, request, field, kind=str):
+        try:
+            body = await request.json()
+        except ValueError:
+            raise web.HTTPBadRequest(text="JSON body expected")
+        if not isinstance(body, dict) or not body.get(field):
+            raise web.HTTPBadRequest(text=f"'{field}' is required")
+        if not isinstance(body[field], kind):
+            raise web.HTTPBadRequest(text=f"'{field}' must be a {kind.__name__}")
+        return body
+
+    async def handle_ask(self, request):
+        body = await self.read_json(request, "question")
+        mode = body.get("mode", "model")
+        if mode not in ("model", "rag"):
+            raise web.HTTPBadRequest(text="mode must be 'model' or 'rag'")
+        return web.json_response(await self.answer(body["question"], mode))
+
+    async def handle_keywords(self, request):
+        body = await self.read_json(request, "text")
+        return web.json_response({"keywords": await self.run(self.nlp_executor, self.extract_keywords, body["text"])})
+
+    async def handle_search(self, request):
+        keywords = (await self.read_json(request, "keywords", list))["keywords"]
+        if not all(isinstance(k, str) and k.strip() for k in keywords):
+            raise web.HTTPBadRequest(text="'keywords' must be a non-empty list of strings")
+        files = await self.run(self.search_executor, Wiki.recherche_fichiers_keywords_sqlite,
+                               self.folder_path, keywords)
+        return web.json_response({"keywords": keywords, "files": files})
+
+    async def handle_health(self, request):
+        return web.json_response({"status": "ok", "in_flight": self.in_flight, "served": self.served,
+                                  "ollama": await self.run(self.probe_executor, OllamaClient.is_server_ready)})
+
+    def make_app(self):
+        app = web.Application(middlewares=[self.admission])
+        app.router.add_post("/ask", self.handle_ask)
+        app.router.add_post("/keywords", self.handle_keywords)
+        app.router.add_post("/search", self.handle_search)
+        app.router.add_get("/health", self.handle_health)
+        app.on_startup.append(self.start)
+        app.on_cleanup.append(self.stop)
+        return app
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="HTTP service for the enrichment Q&A pipeline.")
+    parser.add_argument('--Path', type=str, default='.', help='Corpus folder')
+    parser.add_argument('--Model', type=str, default="qwen2.5-coder:7b", help='Model')
+    parser.add_argument('--NameNewModel', type=str, default="long-text-expert-file", help='Name New Model')
+    parser.add_argument('--NER', type=str, default="all", choices=["all", "routed"],
+                        help='all: run every language pipeline, routed: only the detected language')
+    parser.add_argument('--EmbedModel', type=str, default="nomic-embed-text", help='Embedding model (rag mode)')
+    parser.add_argument('--TopK', type=int, default=5, help='Number of chunks injected per question (rag mode)')
+    parser.add_argument('--URL', type=str, default="http://localhost:11434", help='Ollama server URL')
+    parser.add_argument('--Host', type=str, default="127.0.0.1", help='Listening address')
+    parser.add_argument('--Port', type=int, default=8080, help='Listening port')
+    parser.add_argument('--OllamaConcurrency', type=int, default=OLLAMA_CONCURRENCY,
+                        help='Simultaneous requests sent to Ollama')
+    parser.add_argument('--MaxQueue', type=int, default=MAX_QUEUE, help='Requests accepted at once before 503')
+    args = parser.parse_args()
+
+    OllamaClient.configure(base_url=args.URL, pool_size=max(args.OllamaConcurrency, OllamaClient.POOL_SIZE))
+    Wiki.OLLAMA_BASE_URL = args.URL
+    Wiki.launch_ollama_if_needed()
+    service = WikiService(os.path.abspath(args.Path), args.Model, args.NameNewModel, args.NER,
+                          args.EmbedModel, args.TopK, args.OllamaConcurrency, args.MaxQueue)
+    web.run_app(service.make_app(), host=args.Host, port=args.Port)